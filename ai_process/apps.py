@@ -1,6 +1,29 @@
+import multiprocessing
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+
+
+def _recover(**kwargs):
+    # 얼굴 탐지기 등을 불러오는 jobs는 요청이 들어온 뒤에 import합니다.
+    from ai_process.jobs import recover
+
+    recover()
 
 
 class AiProcessConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_process'
+
+    def ready(self):
+        # 재시작 전에 남은 picgen 작업을 웹 워커의 작업 스레드 풀이 다시 처리하도록 합니다. (jobs.recover)
+        request_started.connect(_recover, dispatch_uid="ai_process.jobs.recover")
+        # AI_PROCESS_WARMUP이 켜져 있으면 워커 기동 시 얼굴 탐지기와 렌더링 프로세스 풀을 미리 생성합니다.
+        if getattr(settings, "AI_PROCESS_WARMUP", False):
+            from ai_process.cat import warm_up
+            from ai_process.pool import get_pool
+
+            warm_up()
+            # 렌더링 프로세스도 django.setup으로 이 메서드를 실행하므로, 풀은 웹 워커(부모 프로세스)에서만 만듭니다.
+            if multiprocessing.parent_process() is None:
+                get_pool()
@@ -1,13 +1,33 @@
+import io
+import logging
+import os
 import cv2
 import dlib
 import numpy as np
 import random
-import os
+from PIL import Image
+from django.conf import settings
+from ai_process.detectors import get_detector
+from ai_process.timing import Stage
+from ai_process.stickers import get_pack, get_resize_cache
+
+logger = logging.getLogger(__name__)
+
+# 렌더링 결과가 달라지는 변경을 하면 올립니다. 렌더 캐시 키에 포함되어 이전 결과를 무효화합니다.
+# 3: 렌더 결과에 너비별 변환사진(derivatives)이 추가되었습니다.
+RENDERER_VERSION = 3
+
+
+def warm_up():
+    """warm_up 얼굴 탐지기 예열
 
-h, w = 0, 0
+    워커 프로세스가 뜰 때 탐지기를 미리 생성해, 첫 사용자 요청이 생성 비용을 치르지 않도록 합니다.
+    """
+    get_detector()(np.zeros((64, 64), dtype=np.uint8))
 
-# a, d 에서 사용
-def width_control(pt1, pt2, control_y):
+
+# top, under 에서 사용
+def width_control(pt1, pt2, control_y, w):
     if abs(pt2[0] - pt1[0]) < w * 0.4:
         width_increase = int((pt2[0] - pt1[0]) * 0.3)
         down_width_increase = pt1[0]
@@ -22,8 +42,8 @@ def width_control(pt1, pt2, control_y):
         return pt1, pt2
 
 
-# b, c에서 사용
-def height_control(pt1, pt2, control_x):
+# left, right 에서 사용
+def height_control(pt1, pt2, control_x, h):
     if abs(pt2[1] - pt1[1]) < h * 0.4:
         height_increase = int(abs(pt2[1] - pt1[1]) * 0.2)
         down_height_increase = pt1[1]
@@ -38,135 +58,594 @@ def height_control(pt1, pt2, control_x):
         return pt1, pt2
 
 
-def random_control(random_images):
-    random_image = random.choice(random_images)
-    sticker_img_path = random_image["img"]
-    return sticker_img_path
+def detect_faces(img, max_side=None, detector=None):
+    """detect_faces 축소 이미지에서 얼굴 탐지
 
+    큰 사진에서도 탐지 시간이 일정하도록, 긴 변이 max_side 이하가 되게 줄인 흑백 사본에서 얼굴을 찾고
+    찾은 얼굴 박스를 원본 해상도 좌표로 되돌려 반환합니다.
 
-def select_target(target, a, b, c, d, x1, x2, y1, y2, center_x, center_y):
-    if target == a:
-        # 랜덤 이미지 딕셔너리
-        random_images = [
-            {"num": 0, "img": "static/imgs/up_cat.png"},
-            {"num": 1, "img": "static/imgs/top_cat1.png"},
-        ]
-        sticker_img_path = random_control(random_images)
-        # 스티커 이미지 로드
-        sticker_img = cv2.imread(sticker_img_path, cv2.IMREAD_UNCHANGED)
-        control_y = a // 2
-        pt1 = x1, y1
-        pt2 = x2, 0
-        pt1, pt2 = width_control(pt1, pt2, control_y)
-    elif target == b:
-        # 랜덤 이미지 딕셔너리
-        random_images = [
-            {"num": 0, "img": "static/imgs/left_cat1.png"},
-            {"num": 1, "img": "static/imgs/left_cat2.png"},
-        ]
-        sticker_img_path = random_control(random_images)
-        # 스티커 이미지 로드
-        sticker_img = cv2.imread(sticker_img_path, cv2.IMREAD_UNCHANGED)
-        control_x = b // 2
-        pt1 = x1, y1
-        pt2 = 0, y2
-        pt1, pt2 = height_control(pt1, pt2, control_x)
-    elif target == c:
-        # 랜덤 이미지 딕셔너리
-        random_images = [
-            {"num": 0, "img": "static/imgs/right_cat.png"},
-            {"num": 1, "img": "static/imgs/right_cat1.png"},
-        ]
-        sticker_img_path = random_control(random_images)
-        # 스티커 이미지 로드
-        sticker_img = cv2.imread(sticker_img_path, cv2.IMREAD_UNCHANGED)
-        control_x = center_x + c // 2
-        pt1 = x2, y1
-        pt2 = w, y2
-        pt1, pt2 = height_control(pt1, pt2, control_x)
-    elif target == d:
-        # 랜덤 이미지 딕셔너리
-        random_images = [
-            {"num": 0, "img": "static/imgs/under_cat.png"},
-            {"num": 1, "img": "static/imgs/under_cat1.png"},
-            {"num": 2, "img": "static/imgs/under_cat2.png"},
-        ]
-        sticker_img_path = random_control(random_images)
-        # 스티커 이미지 로드
-        sticker_img = cv2.imread(sticker_img_path, cv2.IMREAD_UNCHANGED)
-        control_y = center_y + d // 2
-        pt1 = x1, y2
-        pt2 = x2, h
-        pt1, pt2 = width_control(pt1, pt2, control_y)
-    return pt1, pt2, sticker_img, target
-
-
-def picture_generator(input_pic_url):
-    global h, w
-    detector = dlib.get_frontal_face_detector()
-    img = cv2.imread(input_pic_url)
-    dets = detector(img)
-    # 얼굴이 1개 이상 감지된 경우에만 스티커 적용
-    if len(dets) >= 1:
-        # 얼굴 선택 랜덤
-        face_index = random.randrange(len(dets))
-        det = dets[face_index]
-        x1 = det.left()
-        y1 = det.top()
-        x2 = det.right()
-        y2 = det.bottom()
-        h, w, c = img.shape
-        center_x = (x2 + x1) // 2
-        center_y = (y2 + y1) // 2       
-        a = center_y
-        b = center_x
-        c = w - b
-        d = h - a
-        # target = None
-        target_list = [a, b, c, d]
-        target = target_list.pop(target_list.index(max(target_list)))
-        # target = search_target
-        while True:
-            pt1, pt2, sticker_img, target = select_target(
-                target, a, b, c, d, x1, x2, y1, y2, center_x, center_y
+    Args:
+        img (ndarray): 원본 BGR 이미지
+        max_side (int): 탐지용 사본의 최대 변 길이. None이면 settings.AI_PROCESS_DETECT_MAX_SIDE를 사용합니다.
+        detector (str): 얼굴 탐지기 이름 (detectors.DETECTORS). None이면 settings.AI_PROCESS_DETECTOR를 사용합니다.
+    Return:
+        (dlib.rectangles): 원본 해상도 좌표의 얼굴 박스들
+    """
+    if max_side is None:
+        max_side = getattr(settings, "AI_PROCESS_DETECT_MAX_SIDE", 1024)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    scale = max_side / max(gray.shape[:2]) if max_side else 1
+    if scale < 1:
+        gray = cv2.resize(
+            gray, dsize=None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+    else:
+        scale = 1
+    dets = dlib.rectangles()
+    for left, top, right, bottom in get_detector(detector)(gray):
+        dets.append(
+            dlib.rectangle(
+                int(left / scale),
+                int(top / scale),
+                int(right / scale),
+                int(bottom / scale),
             )
-            # 스티커 이미지 크기 변경
-            sticker_width = int(abs(pt2[0] - pt1[0]))
-            sticker_height = int(abs(pt2[1] - pt1[1]))
-            sticker_resized = cv2.resize(
-                sticker_img, dsize=(sticker_width, sticker_height)
+        )
+    return dets
+
+
+def alpha_blend(roi, sticker, premultiplied=False):
+    """alpha_blend 스티커 알파 합성
+
+    BGRA 스티커를 같은 크기의 uint8 BGR 영역(roi) 위에 제자리(in-place)로 합성합니다.
+    float64 배열을 만들지 않고 OpenCV의 uint8 연산만 사용하며,
+    기존 float 합성 결과와 채널당 ±1 이내로 같습니다.
+
+    Args:
+        roi (ndarray): 합성될 원본 이미지 영역 (h, w, 3), uint8. 원본 이미지의 view여도 됩니다.
+        sticker (ndarray): 알파 채널을 포함한 스티커 이미지 (h, w, 4), uint8
+        premultiplied (bool): 스티커 색상 채널에 알파가 이미 곱해져 있는지 여부 (stickers.premultiply)
+    Return:
+        (ndarray): 합성된 roi
+    Raises:
+        ValueError: roi와 스티커의 크기가 다른 경우
+    """
+    if roi.shape[:2] != sticker.shape[:2] or roi.size == 0:
+        raise ValueError("스티커와 합성 영역의 크기가 다릅니다.")
+    alpha = sticker[:, :, 3]
+    alpha = cv2.merge((alpha, alpha, alpha))
+    if premultiplied:
+        overlay = sticker[:, :, :3]
+    else:
+        # 스티커 * a / 255
+        overlay = cv2.multiply(sticker[:, :, :3], alpha, scale=1 / 255)
+    # 원본 * (255 - a) / 255
+    cv2.bitwise_not(alpha, dst=alpha)
+    cv2.multiply(roi, alpha, dst=roi, scale=1 / 255)
+    cv2.add(roi, overlay, dst=roi)
+    return roi
+
+
+def sticker_region(direction, x1, y1, x2, y2, w, h):
+    """sticker_region 방향별 스티커 영역 계산
+
+    얼굴 박스의 한 방향(위/왼쪽/오른쪽/아래)에 붙일 스티커 영역을 계산합니다.
+    얼굴이 사진에 비해 작으면 width_control, height_control로 영역을 넓혀 스티커 비율을 맞춥니다.
+
+    Args:
+        direction (str): "top", "left", "right", "under" 중 하나
+        x1, y1, x2, y2 (int): 얼굴 박스 좌표
+        w, h (int): 사진 크기
+    Return:
+        (tuple): 스티커 영역 (left, top, right, bottom). 사진 밖으로 나갈 수 있습니다.
+    """
+    center_x = (x2 + x1) // 2
+    center_y = (y2 + y1) // 2
+    if direction == "top":
+        pt1, pt2 = width_control((x1, y1), (x2, 0), center_y // 2, w)
+    elif direction == "left":
+        pt1, pt2 = height_control((x1, y1), (0, y2), center_x // 2, h)
+    elif direction == "right":
+        control_x = center_x + (w - center_x) // 2
+        pt1, pt2 = height_control((x2, y1), (w, y2), control_x, h)
+    else:
+        control_y = center_y + (h - center_y) // 2
+        pt1, pt2 = width_control((x1, y2), (x2, h), control_y, w)
+    return (
+        min(pt1[0], pt2[0]),
+        min(pt1[1], pt2[1]),
+        max(pt1[0], pt2[0]),
+        max(pt1[1], pt2[1]),
+    )
+
+
+def overlaps(region, occupied):
+    """overlaps 영역 겹침 확인
+
+    Args:
+        region (tuple): (left, top, right, bottom)
+        occupied (list): 이미 쓰고 있는 (left, top, right, bottom) 영역들
+    Return:
+        (bool): region이 occupied 중 하나와 겹치는지 여부. 변이 맞닿는 것은 겹치지 않은 것으로 봅니다.
+    """
+    left, top, right, bottom = region
+    return any(
+        left < o_right and o_left < right and top < o_bottom and o_top < bottom
+        for o_left, o_top, o_right, o_bottom in occupied
+    )
+
+
+def plan_placement(det, w, h, occupied=()):
+    """plan_placement 스티커 위치 결정
+
+    얼굴 사방 중 여백이 넓은 방향부터 스티커 영역을 계산해, 사진 안에 온전히 들어가는 첫 영역을 고릅니다.
+    모두 사진 밖으로 나가면 여백이 가장 넓은 방향의 영역을 사진 경계에 맞춰 자릅니다.
+    스티커를 실제로 합성해 보기 전에 위치를 정하므로 resize와 합성은 한 번만 실행됩니다.
+
+    Args:
+        det (dlib.rectangle): 얼굴 박스
+        w, h (int): 사진 크기
+        occupied (list): 겹치면 안 되는 (left, top, right, bottom) 영역들. 다른 얼굴이나 이미 붙인 스티커 영역입니다.
+    Return:
+        (tuple): (방향, (left, top, right, bottom)). 스티커를 붙일 수 없으면 None
+    """
+    x1, y1, x2, y2 = det.left(), det.top(), det.right(), det.bottom()
+    center_x = (x2 + x1) // 2
+    center_y = (y2 + y1) // 2
+    margins = {
+        "top": center_y,
+        "left": center_x,
+        "right": w - center_x,
+        "under": h - center_y,
+    }
+    # 여백이 같으면 top, left, right, under 순서를 유지합니다.
+    directions = sorted(margins, key=margins.get, reverse=True)
+    regions = [
+        (direction, sticker_region(direction, x1, y1, x2, y2, w, h))
+        for direction in directions
+    ]
+    for direction, (left, top, right, bottom) in regions:
+        if 0 <= left < right <= w and 0 <= top < bottom <= h:
+            if not overlaps((left, top, right, bottom), occupied):
+                return direction, (left, top, right, bottom)
+    # 겹치면 안 되는 영역이 있으면 잘라낸 영역도 여백이 넓은 방향부터 차례로 확인합니다.
+    for direction, (left, top, right, bottom) in regions if occupied else regions[:1]:
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, w), min(bottom, h)
+        if left < right and top < bottom:
+            if not overlaps((left, top, right, bottom), occupied):
+                return direction, (left, top, right, bottom)
+    return None
+
+
+def face_boxes(dets):
+    """face_boxes 얼굴 박스를 리스트로 바꾸기
+
+    Args:
+        dets (dlib.rectangles): detect_faces의 결과
+    Return:
+        (list): [left, top, right, bottom] 리스트. Picture.faces에 저장하거나 프로세스 간에 넘길 수 있습니다.
+    """
+    return [[det.left(), det.top(), det.right(), det.bottom()] for det in dets]
+
+
+def scale_faces(faces, size, new_size):
+    """scale_faces 얼굴 박스를 다른 크기의 사진에 맞추기
+
+    미리보기처럼 줄인 사진에서 탐지한 얼굴 박스를 같은 사진의 다른 크기 좌표로 바꿉니다.
+
+    Args:
+        faces (list): [left, top, right, bottom] 얼굴 박스 리스트
+        size (tuple): faces를 탐지한 사진의 (width, height)
+        new_size (tuple): 맞출 사진의 (width, height)
+    Return:
+        (list): new_size 좌표의 얼굴 박스 리스트
+    """
+    sx = new_size[0] / size[0]
+    sy = new_size[1] / size[1]
+    return [
+        [round(left * sx), round(top * sy), round(right * sx), round(bottom * sy)]
+        for left, top, right, bottom in faces
+    ]
+
+
+def choose(faces, w, h, rng=random):
+    """choose 얼굴과 스티커 선택
+
+    rng로 얼굴 하나를 고르고, 그 얼굴의 스티커 위치를 정한 뒤 그 방향의 스티커 하나를 고릅니다.
+    이미지를 쓰지 않으므로 같은 rng 상태로 어떤 선택이 나올지 미리 알 수 있습니다.
+
+    Args:
+        faces (list): [left, top, right, bottom] 얼굴 박스 리스트. 비어있으면 안 됩니다.
+        w, h (int): 사진 크기
+        rng (random.Random): 얼굴/스티커 선택에 사용할 난수 생성기
+    Return:
+        (tuple): (얼굴 번호, 스티커 정보, (left, top, right, bottom)). 스티커를 붙일 공간이 없으면 None
+    """
+    # 얼굴 선택 랜덤
+    face_index = rng.randrange(len(faces))
+    placement = plan_placement(dlib.rectangle(*faces[face_index]), w, h)
+    if placement is None:
+        return None
+    direction, region = placement
+    # 방향에 맞는 스티커 랜덤 선택
+    entry = rng.choice(get_pack().directions[direction])
+    return face_index, entry, region
+
+
+def choose_all(faces, w, h, rng=random):
+    """choose_all 모든 얼굴의 스티커 선택
+
+    큰 얼굴부터 차례로, 다른 얼굴과 이미 정한 스티커 영역에 겹치지 않는 스티커 위치를 정하고 스티커를 고릅니다.
+    겹치지 않는 위치가 없는 얼굴은 건너뜁니다.
+
+    Args:
+        faces (list): [left, top, right, bottom] 얼굴 박스 리스트
+        w, h (int): 사진 크기
+        rng (random.Random): 스티커 선택에 사용할 난수 생성기
+    Return:
+        (list): (얼굴 번호, 스티커 정보, (left, top, right, bottom)) 리스트
+    """
+    order = sorted(
+        range(len(faces)),
+        key=lambda i: (faces[i][2] - faces[i][0]) * (faces[i][3] - faces[i][1]),
+        reverse=True,
+    )
+    choices = []
+    occupied = []
+    for face_index in order:
+        others = [face for i, face in enumerate(faces) if i != face_index]
+        placement = plan_placement(
+            dlib.rectangle(*faces[face_index]), w, h, occupied + others
+        )
+        if placement is None:
+            continue
+        direction, region = placement
+        entry = rng.choice(get_pack().directions[direction])
+        choices.append((face_index, entry, region))
+        occupied.append(region)
+    return choices
+
+
+def replay(faces, w, h, placements):
+    """replay 저장한 얼굴과 스티커로 스티커 위치 다시 계산
+
+    미리보기에서 고른 얼굴 번호와 스티커를 그대로 쓰고, 그 스티커 방향의 영역만 이 사진 크기에서 다시 계산합니다.
+    얼굴 박스를 다른 크기로 맞추며 생긴 반올림 차이로 다른 방향이나 스티커가 골라지지 않습니다.
+
+    Args:
+        faces (list): [left, top, right, bottom] 얼굴 박스 리스트
+        w, h (int): 사진 크기
+        placements (list): [얼굴 번호, 스티커 id] 리스트 (render의 info["placements"])
+    Return:
+        (list): (얼굴 번호, 스티커 정보, (left, top, right, bottom)) 리스트.
+            스티커 묶음에 없는 스티커나 없는 얼굴 번호가 있으면 None
+    """
+    pack = get_pack()
+    choices = []
+    for face_index, sticker_id in placements:
+        entry = pack.ids.get(sticker_id)
+        if entry is None or not 0 <= face_index < len(faces):
+            return None
+        left, top, right, bottom = sticker_region(
+            entry["direction"], *faces[face_index], w, h
+        )
+        # plan_placement와 같이 사진 밖으로 나간 영역은 사진 경계에 맞춰 자릅니다.
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, w), min(bottom, h)
+        if left < right and top < bottom:
+            choices.append((face_index, entry, (left, top, right, bottom)))
+    return choices
+
+
+def render(img, rng=random, faces=None, info=None, all_faces=False, placements=None):
+    """render 사진에 화난 고양이 스티커 합성
+
+    사진에서 얼굴을 찾아 그 주변의 가장 넓은 공간에 고양이 스티커를 제자리(in-place)로 합성합니다.
+    모듈 전역 상태를 쓰지 않으므로 여러 스레드에서 동시에 호출해도 안전합니다.
+    얼굴 박스를 넘기면 얼굴 탐지를 건너뛰고, 스티커 resize와 합성만 한 번씩 실행합니다.
+
+    Args:
+        img (ndarray): BGR 이미지. 이 배열에 직접 합성됩니다.
+        rng (random.Random): 얼굴/스티커 선택에 사용할 난수 생성기. 기본값은 random 모듈입니다.
+        faces (list): 이전에 탐지한 [left, top, right, bottom] 얼굴 박스 리스트. None이면 얼굴을 탐지합니다.
+        info (dict): 넘기면 사진 크기(width, height), 얼굴 박스(faces), 선택한 얼굴 번호(face)와 스티커 id(sticker),
+            붙인 [얼굴 번호, 스티커 id] 리스트(placements)를 채웁니다.
+            모든 얼굴 모드에서는 face가 None이고 sticker는 스티커 id들을 쉼표로 이은 문자열입니다.
+        all_faces (bool): 모든 얼굴에 겹치지 않게 스티커를 붙일지 여부 (choose_all).
+            한 번 디코딩한 이미지에 얼굴마다 resize와 합성을 한 번씩 실행합니다.
+        placements (list): 이전에 고른 [얼굴 번호, 스티커 id] 리스트. faces와 함께 넘기면 rng로 고르지 않고
+            같은 얼굴에 같은 스티커를 붙입니다. (replay 참고)
+    Return:
+        (ndarray): 합성된 이미지
+    """
+    h, w = img.shape[:2]
+    if faces is None:
+        with Stage("detect"):
+            faces = face_boxes(detect_faces(img))
+        # 새로 탐지한 얼굴 박스에는 이전 얼굴 번호가 맞지 않습니다.
+        placements = None
+    if info is not None:
+        info.update(
+            width=w, height=h, faces=faces, face=None, sticker="", placements=[]
+        )
+    # 얼굴이 1개 이상 감지된 경우에만 스티커 적용
+    if len(faces) >= 1:
+        # 미리보기에서 고른 얼굴과 스티커가 있으면 rng로 다시 고르지 않습니다.
+        choices = None
+        if placements is not None:
+            choices = replay(faces, w, h, placements)
+        if choices is None and all_faces:
+            choices = choose_all(faces, w, h, rng)
+        elif choices is None:
+            choice = choose(faces, w, h, rng)
+            choices = [choice] if choice is not None else []
+        if not choices:
+            logger.info("스티커를 붙일 공간이 없다.")
+            return img
+        pack = get_pack()
+        for face_index, entry, (left, top, right, bottom) in choices:
+            # 스티커 이미지 크기 변경 (크기별 캐시 사용, 알파가 곱해진 스티커)
+            with Stage("resize"):
+                sticker_resized = get_resize_cache().get(
+                    pack, entry, right - left, bottom - top
+                )
+            with Stage("blend"):
+                alpha_blend(
+                    img[top:bottom, left:right], sticker_resized, premultiplied=True
+                )
+        if info is not None:
+            info.update(
+                face=None if all_faces else choices[0][0],
+                sticker=",".join(entry["id"] for _, entry, _ in choices),
+                placements=[
+                    [face_index, entry["id"]] for face_index, entry, _ in choices
+                ],
             )
-            # 알파 채널 값(투명도) 계산
-            alpha = sticker_resized[:, :, 3] / 255.0
-            alpha = np.expand_dims(alpha, axis=2)
-            overlay_rgb = sticker_resized[:, :, :3]
-            try:
-                img[
-                    min(pt1[1], pt2[1]) : max(pt1[1], pt2[1]),
-                    min(pt1[0], pt2[0]) : max(pt1[0], pt2[0]),
-                ] = (
-                    alpha * overlay_rgb
-                    + (1.0 - alpha)
-                    * img[
-                        min(pt1[1], pt2[1]) : max(pt1[1], pt2[1]),
-                        min(pt1[0], pt2[0]) : max(pt1[0], pt2[0]),
-                    ]
-                )[
-                    :, :, :3
-                ]
-            except:
-                target = target_list.pop(target_list.index(max(target_list)))
-                # pt1, pt2, sticker_img, target = select_target(
-                #     target, a, b, c, d, x1, x2, y1, y2, center_x, center_y
-                # )
-                continue
-            break
     else:
-        print("얼굴이 탐지되지 않았다.")
-    # 출력
-    save_uri = input_pic_url.replace("input", "change")
-    save_dir = "/".join(save_uri.split("/")[:-1])
-    if not os.path.exists(save_dir):
-        os.mkdir(save_dir)
-    cv2.imwrite(save_uri, img)
-    return save_uri
+        logger.info("얼굴이 탐지되지 않았다.")
+    return img
+
+
+class ImageTooLarge(ValueError):
+    """ImageTooLarge 픽셀 수 제한(settings.AI_PROCESS_MAX_PIXELS)을 넘는 사진"""
+
+
+# 긴 변이 최대 출력 크기의 몇 배 이상일 때 JPEG DCT 축소 디코딩을 쓸지 정합니다.
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def read_size(data):
+    """read_size 사진 헤더에서 크기 읽기
+
+    픽셀 데이터를 디코딩하지 않고 헤더만 읽어 크기를 확인하고, 픽셀 수 제한을 넘으면 거부합니다.
+
+    Args:
+        data (bytes): 업로드된 이미지 파일의 내용
+    Return:
+        (tuple): (width, height)
+    Raises:
+        ImageTooLarge: 픽셀 수가 settings.AI_PROCESS_MAX_PIXELS를 넘는 경우
+        ValueError: 헤더를 읽을 수 없는 경우
+    """
+    try:
+        # Pillow의 Image.open은 헤더만 읽고 픽셀은 load할 때 디코딩합니다.
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise ImageTooLarge("이미지가 너무 큽니다.")
+    except OSError:
+        raise ValueError("이미지를 읽을 수 없습니다.")
+    max_pixels = getattr(settings, "AI_PROCESS_MAX_PIXELS", 40 * 10**6)
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge("이미지가 너무 큽니다.")
+    return width, height
+
+
+def decode(data, max_side=None):
+    """decode 업로드 바이트를 이미지로 디코딩
+
+    헤더로 크기를 먼저 확인한 뒤, 긴 변이 max_side의 2배 이상이면 JPEG DCT 축소(1/2, 1/4, 1/8)로 디코딩해
+    원본 해상도의 픽셀 배열을 만들지 않습니다. 그래도 max_side보다 크면 max_side에 맞춰 줄입니다.
+
+    Args:
+        data (bytes): 업로드된 이미지 파일의 내용
+        max_side (int): 출력 사진의 최대 변 길이. None이면 settings.AI_PROCESS_MAX_SIDE를 사용하고, 0이면 줄이지 않습니다.
+    Return:
+        (ndarray): BGR 이미지
+    Raises:
+        ImageTooLarge: 픽셀 수 제한을 넘는 경우 (디코딩 전에 거부)
+        ValueError: OpenCV가 읽을 수 없는 이미지인 경우
+    """
+    if max_side is None:
+        max_side = getattr(settings, "AI_PROCESS_MAX_SIDE", 2048)
+    longest = max(read_size(data))
+    flag = cv2.IMREAD_COLOR
+    if max_side:
+        for factor, reduced in REDUCED_FLAGS:
+            if longest // factor >= max_side:
+                flag = reduced
+                break
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if img is None:
+        raise ValueError("이미지를 읽을 수 없습니다.")
+    scale = max_side / max(img.shape[:2]) if max_side else 1
+    if scale < 1:
+        img = cv2.resize(
+            img, dsize=None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+    return img
+
+
+# 출력 형식별 파일 확장자
+FORMAT_EXTS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+EXT_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+
+
+def format_of(name):
+    """format_of 파일 이름으로 이미지 형식 알아내기
+
+    Args:
+        name (str): 파일 이름 또는 경로
+    Return:
+        (str): "jpeg", "png", "webp" 중 하나. 알 수 없는 확장자는 "jpeg"
+    """
+    return EXT_FORMATS.get(os.path.splitext(name)[1].lower(), "jpeg")
+
+
+def output_format(input_name):
+    """output_format 변환사진 형식 정하기
+
+    Args:
+        input_name (str): 입력사진 파일 이름
+    Return:
+        (str): settings.AI_PROCESS_OUTPUT_FORMAT. 비어 있으면 입력사진과 같은 형식
+    """
+    fmt = getattr(settings, "AI_PROCESS_OUTPUT_FORMAT", "webp")
+    return fmt or format_of(input_name)
+
+
+def encode(img, fmt="jpeg", quality=None):
+    """encode 이미지를 파일 바이트로 인코딩
+
+    JPEG은 progressive, 허프만 테이블 최적화로, WebP는 손실 압축으로 인코딩합니다.
+    OpenCV 인코더는 EXIF, ICC 등 메타데이터를 쓰지 않으므로 결과에는 픽셀만 남습니다.
+    (디코딩할 때 EXIF 회전은 픽셀에 이미 적용됩니다.)
+
+    Args:
+        img (ndarray): BGR 이미지
+        fmt (str): "jpeg", "png", "webp" 중 하나 (FORMAT_EXTS)
+        quality (int): JPEG, WebP 품질(1~100). None이면 settings.AI_PROCESS_OUTPUT_QUALITY를 사용합니다.
+    Return:
+        (bytes): 인코딩된 이미지 파일의 내용
+    Raises:
+        ValueError: 지원하지 않는 형식이거나 인코딩에 실패한 경우
+    """
+    if quality is None:
+        quality = getattr(settings, "AI_PROCESS_OUTPUT_QUALITY", 85)
+    if fmt == "jpeg":
+        params = [
+            cv2.IMWRITE_JPEG_QUALITY,
+            quality,
+            cv2.IMWRITE_JPEG_PROGRESSIVE,
+            1,
+            cv2.IMWRITE_JPEG_OPTIMIZE,
+            1,
+        ]
+    elif fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif fmt == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 6]
+    else:
+        raise ValueError(f"{fmt} 형식으로 인코딩할 수 없습니다.")
+    ok, buf = cv2.imencode(FORMAT_EXTS[fmt], img, params)
+    if not ok:
+        raise ValueError(f"{fmt} 형식으로 인코딩할 수 없습니다.")
+    return buf.tobytes()
+
+
+def derive(img, widths, fmt="jpeg"):
+    """derive 반응형 크기의 변환사진 만들기
+
+    합성이 끝난 이미지를 너비별로 줄여 인코딩합니다. 큰 너비부터 만들고 그 결과를 다시 줄이므로
+    작은 크기일수록 resize할 픽셀이 적습니다.
+
+    Args:
+        img (ndarray): 합성된 BGR 이미지
+        widths (list): 만들 너비(px)들. 원본 너비 이상은 건너뜁니다.
+        fmt (str): 출력 형식 (encode 참고)
+    Return:
+        (dict): {너비: 인코딩된 이미지 파일의 내용}
+    """
+    h, w = img.shape[:2]
+    derivatives = {}
+    source = img
+    for width in sorted(set(widths), reverse=True):
+        if width >= w:
+            continue
+        height = max(1, round(h * width / w))
+        source = cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+        derivatives[width] = encode(source, fmt)
+    return derivatives
+
+
+def picture_generator(
+    data,
+    fmt="jpeg",
+    rng=random,
+    renderer=render,
+    faces=None,
+    info=None,
+    all_faces=False,
+    size=None,
+    derivatives=None,
+    placements=None,
+):
+    """picture_generator 변환사진 생성
+
+    업로드된 사진 바이트를 메모리에서 디코딩하고 스티커를 합성한 뒤 다시 인코딩합니다.
+    파일을 읽거나 쓰지 않으므로, 저장은 호출하는 쪽에서 Django storage로 한 번만 합니다.
+    decode, detect, resize, blend, derive, encode 단계의 시간은 timing.record()로 측정중일 때 기록됩니다.
+
+    Args:
+        data (bytes): 입력 사진 파일의 내용
+        fmt (str): 출력 형식 (encode 참고)
+        rng (random.Random): 얼굴/스티커 선택에 사용할 난수 생성기
+        renderer (function): render 또는 렌더링 프로세스 풀의 RenderPool.render
+        faces (list): 이전에 탐지한 얼굴 박스 리스트. None이면 얼굴을 탐지합니다. (render 참고)
+        info (dict): 넘기면 렌더링 정보를 채웁니다. (render 참고)
+        all_faces (bool): 모든 얼굴에 스티커를 붙일지 여부 (render 참고)
+        size (tuple): faces를 탐지한 사진의 (width, height). 디코딩한 사진 크기와 다르면 faces를 그 크기에 맞춥니다.
+        derivatives (dict): 넘기면 settings.AI_PROCESS_DERIVATIVE_WIDTHS 너비로 줄인 변환사진을 {너비: 바이트}로 채웁니다.
+        placements (list): 이전에 고른 [얼굴 번호, 스티커 id] 리스트. faces와 함께 넘깁니다. (render 참고)
+    Return:
+        (bytes): 변환된 사진 파일의 내용
+    Raises:
+        ImageTooLarge: 입력 사진의 픽셀 수가 제한을 넘는 경우
+        ValueError: 입력 사진을 읽을 수 없는 경우
+    """
+    with Stage("decode"):
+        img = decode(data)
+    img_size = (img.shape[1], img.shape[0])
+    if faces is not None and size is not None and tuple(size) != img_size:
+        # 미리보기에서 탐지했거나 최대 출력 크기 설정이 바뀌어 얼굴 박스의 좌표계가 다른 경우입니다.
+        # 얼굴 탐지도 축소한 사진에서 하므로(detect_faces) 다시 탐지하지 않고 좌표만 맞춥니다.
+        faces = scale_faces(faces, size, img_size) if all(size) else None
+    renderer(
+        img, rng, faces=faces, info=info, all_faces=all_faces, placements=placements
+    )
+    if derivatives is not None:
+        widths = getattr(settings, "AI_PROCESS_DERIVATIVE_WIDTHS", (320, 640, 1280))
+        with Stage("derive"):
+            derivatives.update(derive(img, widths, fmt))
+    with Stage("encode"):
+        return encode(img, fmt)
+
+
+def preview(data, rng=random, info=None, all_faces=False):
+    """preview 저해상도 미리보기 생성
+
+    settings.AI_PROCESS_PREVIEW_SIDE로 줄여 디코딩한 사진에서 얼굴 탐지, 스티커 배치, 합성을 모두 하고
+    작은 JPEG으로 인코딩합니다. 렌더링 프로세스 풀을 거치지 않고 요청 스레드에서 바로 실행합니다.
+    info의 faces와 placements를 저장해 두면 picture_generator가 같은 얼굴과 스티커로 전체 해상도 변환사진을 만듭니다.
+
+    Args:
+        data (bytes): 입력 사진 파일의 내용
+        rng (random.Random): 얼굴/스티커 선택에 사용할 난수 생성기
+        info (dict): 넘기면 미리보기 크기 기준의 렌더링 정보를 채웁니다. (render 참고)
+        all_faces (bool): 모든 얼굴에 스티커를 붙일지 여부 (render 참고)
+    Return:
+        (bytes): 미리보기 JPEG 파일의 내용
+    Raises:
+        ImageTooLarge: 입력 사진의 픽셀 수가 제한을 넘는 경우
+        ValueError: 입력 사진을 읽을 수 없는 경우
+    """
+    with Stage("decode"):
+        img = decode(data, getattr(settings, "AI_PROCESS_PREVIEW_SIDE", 640))
+    render(img, rng, info=info, all_faces=all_faces)
+    with Stage("encode"):
+        return encode(img, "jpeg", getattr(settings, "AI_PROCESS_PREVIEW_QUALITY", 70))
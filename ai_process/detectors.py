@@ -0,0 +1,128 @@
+import os
+import pickle
+import threading
+import cv2
+import dlib
+from django.conf import settings
+
+# 얼굴 탐지기는 생성 비용이 크므로 프로세스당 한 번만 만들어 재사용합니다.
+# dlib 탐지기와 OpenCV CascadeClassifier는 스레드 간 공유가 안전하지 않으므로 스레드별 사본을 씁니다.
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+class DlibDetector:
+    """DlibDetector dlib HOG 얼굴 탐지기
+
+    dlib.get_frontal_face_detector()는 처음 호출될 때 한 번만 생성하고,
+    각 스레드는 그 탐지기의 사본(pickle 복원, 수 ms)을 하나씩 만들어 계속 재사용합니다.
+    """
+
+    name = "dlib"
+
+    def __init__(self):
+        self._bytes = pickle.dumps(dlib.get_frontal_face_detector())
+        self._local = threading.local()
+
+    def _get(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = pickle.loads(self._bytes)
+            self._local.detector = detector
+        return detector
+
+    def __call__(self, gray):
+        """DlibDetector 얼굴 탐지
+
+        Args:
+            gray (ndarray): 흑백 이미지 (h, w), uint8
+        Return:
+            (list): [left, top, right, bottom] 얼굴 박스 리스트
+        """
+        return [
+            [det.left(), det.top(), det.right(), det.bottom()]
+            for det in self._get()(gray)
+        ]
+
+
+class HaarDetector:
+    """HaarDetector OpenCV Haar cascade 얼굴 탐지기
+
+    opencv-python에 포함된 haarcascade_frontalface_default.xml을 사용합니다.
+    dlib HOG가 놓치는 작은 얼굴도 찾지만 더 느리거나 오탐이 많을 수 있으므로,
+    배포 환경의 사진으로 bench_detectors 명령어를 실행해 비교한 뒤 고릅니다.
+
+    Attributes:
+        path (str): cascade 파일 경로
+        scale_factor (float): 탐지 창을 키우는 비율
+        min_neighbors (int): 얼굴로 인정할 최소 이웃 탐지 수. 클수록 오탐이 줄어듭니다.
+        min_size (int): 찾을 얼굴의 최소 크기(px). 작을수록 느려집니다.
+    """
+
+    name = "haar"
+
+    def __init__(self, path=None, scale_factor=1.2, min_neighbors=5, min_size=40):
+        self.path = path or os.path.join(
+            cv2.data.haarcascades, "haarcascade_frontalface_default.xml"
+        )
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._local = threading.local()
+        # 파일이 없거나 읽을 수 없으면 첫 요청이 아니라 생성할 때 알 수 있도록 한 번 읽어 봅니다.
+        self._get()
+
+    def _get(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.path)
+            if cascade.empty():
+                raise ValueError(f"cascade 파일을 읽을 수 없습니다: {self.path}")
+            self._local.cascade = cascade
+        return cascade
+
+    def __call__(self, gray):
+        """HaarDetector 얼굴 탐지
+
+        Args:
+            gray (ndarray): 흑백 이미지 (h, w), uint8
+        Return:
+            (list): [left, top, right, bottom] 얼굴 박스 리스트
+        """
+        boxes = self._get().detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size),
+        )
+        return [[int(x), int(y), int(x + w), int(y + h)] for x, y, w, h in boxes]
+
+
+DETECTORS = {
+    DlibDetector.name: DlibDetector,
+    HaarDetector.name: HaarDetector,
+}
+
+
+def get_detector(name=None):
+    """get_detector 프로세스 공용 얼굴 탐지기 가져오기
+
+    Args:
+        name (str): DETECTORS의 탐지기 이름. None이면 settings.AI_PROCESS_DETECTOR를 사용합니다.
+    Return:
+        (DlibDetector | HaarDetector): 흑백 이미지를 받아 얼굴 박스 리스트를 반환하는 탐지기
+    Raises:
+        ValueError: 등록되지 않은 탐지기 이름인 경우
+    """
+    if name is None:
+        name = getattr(settings, "AI_PROCESS_DETECTOR", DlibDetector.name)
+    detector = _detectors.get(name)
+    if detector is None:
+        if name not in DETECTORS:
+            raise ValueError(f"알 수 없는 얼굴 탐지기입니다: {name}")
+        with _detectors_lock:
+            detector = _detectors.get(name)
+            if detector is None:
+                detector = DETECTORS[name]()
+                _detectors[name] = detector
+    return detector
@@ -0,0 +1,413 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from ai_process.cat import (
+    FORMAT_EXTS,
+    choose,
+    choose_all,
+    format_of,
+    output_format,
+    picture_generator,
+    preview,
+    render,
+)
+from ai_process.models import Picture, delete_change_pic, new_seed
+from ai_process.pool import get_pool
+from ai_process.render_cache import lookup, render_key, store
+from ai_process.timing import Stage, record
+
+logger = logging.getLogger(__name__)
+
+# 비동기 picgen 작업 큐입니다.
+# 별도 브로커 없이 Picture.status를 큐로 사용하고, 워커 프로세스 안의 스레드 풀이 작업을 처리합니다.
+_executor = None
+_executor_lock = threading.Lock()
+_materialize_lock = threading.Lock()
+_recover_lock = threading.Lock()
+_recovered_at = None
+
+# 스티커를 다시 고를 때 이전과 다른 얼굴/스티커가 나오는 시드를 찾을 최대 시도 횟수입니다.
+REROLL_TRIES = 16
+
+
+def _change_name(picture):
+    # 변환사진 파일 이름은 입력사진 이름에 인코딩 형식의 확장자를 붙입니다.
+    stem = os.path.splitext(os.path.basename(picture.input_pic.name))[0]
+    return stem + FORMAT_EXTS[picture.change_format]
+
+
+def _generate(picture, data, info=None, derivatives=None):
+    # 같은 input_pic과 seed로는 언제나 같은 변환사진이 만들어집니다.
+    # 저장해 둔 얼굴 박스가 있으면 얼굴 탐지를 건너뛰고, 저장해 둔 얼굴과 스티커(placements)가 있으면 그대로 붙입니다.
+    pool = get_pool()
+    renderer = pool.render if pool is not None else render
+    rng = random.Random(picture.seed)
+    return picture_generator(
+        data,
+        picture.change_format,
+        rng=rng,
+        renderer=renderer,
+        faces=picture.faces,
+        size=(picture.width, picture.height),
+        info=info,
+        all_faces=picture.mode == Picture.ALL_FACES,
+        derivatives=derivatives,
+        placements=picture.placements,
+    )
+
+
+def _save_derivatives(name, derivatives):
+    # 너비별 변환사진은 변환사진과 같은 폴더에 "이름_너비w.확장자"로 저장합니다.
+    base, ext = os.path.splitext(name)
+    return {
+        str(width): default_storage.save(f"{base}_{width}w{ext}", ContentFile(content))
+        for width, content in derivatives.items()
+    }
+
+
+def _save_render(picture, change_pic, derivatives):
+    with Stage("storage"):
+        picture.change_pic.save(
+            _change_name(picture), ContentFile(change_pic), save=False
+        )
+        picture.derivatives = _save_derivatives(picture.change_pic.name, derivatives)
+
+
+def _apply_info(picture, info):
+    fields = (
+        "width",
+        "height",
+        "faces",
+        "face",
+        "sticker",
+        "placements",
+        "derivatives",
+    )
+    for field in fields:
+        if field in info:
+            setattr(picture, field, info[field])
+
+
+def render_picture(picture, data=None):
+    """render_picture Picture의 변환사진 생성
+
+    Picture의 input_pic과 seed로 변환사진과 너비별 변환사진을 만들어 change_pic, derivatives에 저장합니다.
+    같은 사진을 변환한 적이 있으면 렌더 캐시의 변환사진과 시드를 그대로 씁니다.
+    미리보기를 만든 Picture는 미리보기의 얼굴 박스에 미리보기에서 고른 얼굴과 스티커(placements)를 붙입니다.
+    렌더링 프로세스 풀이 켜져 있으면(settings.AI_PROCESS_POOL_SIZE) 합성은 풀에서 실행됩니다.
+
+    Args:
+        picture (Picture): 변환할 Picture ORM객체
+        data (bytes): 입력 사진 파일의 내용. 없으면 storage에서 input_pic을 읽습니다.
+    Raises:
+        TimeoutError: 렌더링 프로세스 풀이 제한 시간 안에 결과를 주지 못한 경우
+        ValueError: 입력 사진을 읽을 수 없는 경우
+    """
+    if data is None:
+        with Stage("storage"), picture.input_pic.open("rb") as f:
+            data = f.read()
+    picture.change_format = output_format(picture.input_pic.name)
+    # 같은 사진의 변환사진이 캐시에 있으면 디코딩 없이 그 파일을 함께 씁니다.
+    # 미리보기로 얼굴과 시드가 정해진 Picture는 미리보기와 같은 결과가 나오도록 캐시를 쓰지 않습니다.
+    key = render_key(data, picture.change_format, picture.mode)
+    use_cache = picture.faces is None
+    cached = lookup(key) if use_cache else None
+    if cached is not None:
+        picture.change_pic.name = cached.change_pic
+        picture.seed = cached.seed
+        if cached.info is not None:
+            _apply_info(picture, cached.info)
+    else:
+        info = {}
+        derivatives = {}
+        change_pic = _generate(picture, data, info, derivatives)
+        _apply_info(picture, info)
+        _save_render(picture, change_pic, derivatives)
+        info["derivatives"] = picture.derivatives
+    picture.status = Picture.DONE
+    picture.save()
+    if use_cache and cached is None:
+        store(key, picture.change_pic.name, len(change_pic), picture.seed, info)
+
+
+def preview_picture(picture, data):
+    """preview_picture Picture의 미리보기 생성
+
+    줄인 사진으로 미리보기를 만들고, 얼굴 박스와 렌더링 정보를 저장해 Picture를 미리보기(PREVIEW) 상태로 둡니다.
+    전체 해상도 변환사진은 게시글에 붙일 때(commit) 같은 얼굴과 스티커로 만들어집니다.
+
+    Args:
+        picture (Picture): 미리보기를 만들 Picture ORM객체
+        data (bytes): 입력 사진 파일의 내용
+    Return:
+        (bytes): 미리보기 JPEG 파일의 내용
+    Raises:
+        ValueError: 입력 사진을 읽을 수 없는 경우
+    """
+    info = {}
+    content = preview(
+        data,
+        random.Random(picture.seed),
+        info=info,
+        all_faces=picture.mode == Picture.ALL_FACES,
+    )
+    _apply_info(picture, info)
+    picture.status = Picture.PREVIEW
+    picture.save()
+    return content
+
+
+def commit(picture):
+    """commit 미리보기 Picture의 전체 해상도 변환
+
+    게시글에 붙인 Picture가 미리보기 상태이면 변환사진을 만듭니다.
+    비동기 모드(settings.AI_PROCESS_PICGEN_ASYNC)이면 작업 큐에 넘기고, 아니면 바로 처리합니다.
+    변환에 실패하면 Picture는 실패(FAILED) 상태가 됩니다.
+
+    Args:
+        picture (Picture): 게시글에 붙인 Picture ORM객체
+    """
+    if picture.status != Picture.PREVIEW:
+        return
+    if getattr(settings, "AI_PROCESS_PICGEN_ASYNC", False):
+        enqueue(picture)
+        return
+    picture.status = Picture.PENDING
+    picture.save(update_fields=["status"])
+    process(picture.id)
+    picture.refresh_from_db()
+
+
+def materialize(picture):
+    """materialize 지워진 변환사진 다시 만들기
+
+    drop_renders 명령어로 파일만 지워진 change_pic을 input_pic과 seed로 다시 렌더링해 같은 경로에 저장합니다.
+    렌더링은 결정적이므로 지우기 전과 같은 사진이 만들어집니다. 인코딩 형식은 저장된 change_format을 따릅니다.
+    drop_renders가 함께 지운 너비별 변환사진도 이번 렌더링으로 다시 만들어, 같은 change_pic을 쓰는 Picture의 derivatives에 저장합니다.
+
+    Args:
+        picture (Picture): 변환사진을 다시 만들 Picture ORM객체
+    Return:
+        (bool): 변환사진 파일이 (이미 있었거나 다시 만들어져) 존재하는지 여부
+    """
+    name = picture.change_pic.name
+    if not name or default_storage.exists(name):
+        return bool(name)
+    if picture.seed is None or not default_storage.exists(picture.input_pic.name):
+        return False
+    if not picture.change_format:
+        picture.change_format = format_of(name)
+    with picture.input_pic.open("rb") as f:
+        data = f.read()
+    derivatives = {}
+    change_pic = _generate(picture, data, derivatives=derivatives)
+    # 같은 사진을 동시에 요청한 다른 스레드가 먼저 저장했으면 그 파일을 씁니다.
+    with _materialize_lock:
+        if not default_storage.exists(name):
+            saved = default_storage.save(name, ContentFile(change_pic))
+            picture.change_pic.name = saved
+            picture.derivatives = _save_derivatives(saved, derivatives)
+            Picture.objects.filter(change_pic=name).update(
+                change_pic=saved, derivatives=picture.derivatives
+            )
+        else:
+            picture.refresh_from_db(fields=["change_pic", "derivatives"])
+    return True
+
+
+def _choice(picture, seed):
+    # seed로 렌더링하면 고르게 될 (얼굴 번호, 스티커 id)를 이미지 없이 계산합니다.
+    rng = random.Random(seed)
+    if picture.mode == Picture.ALL_FACES:
+        choices = choose_all(picture.faces, picture.width, picture.height, rng)
+        return None, ",".join(entry["id"] for _, entry, _ in choices)
+    choice = choose(picture.faces, picture.width, picture.height, rng)
+    if choice is None:
+        return None, ""
+    return choice[0], choice[1]["id"]
+
+
+def reroll(picture):
+    """reroll 스티커 다시 고르기
+
+    저장해 둔 얼굴 박스로 얼굴/스티커를 다시 골라 변환사진을 새로 만듭니다.
+    얼굴 탐지를 건너뛰므로 디코딩, 인코딩 외에는 스티커 resize와 합성 한 번씩만 실행됩니다.
+    새 시드는 이전과 다른 얼굴이나 스티커가 나오도록 고르며, 다른 선택지가 없으면 같은 스티커가 나올 수 있습니다.
+    얼굴 박스가 없는 이전 Picture는 이번에 한 번 얼굴을 탐지해 저장합니다.
+
+    Args:
+        picture (Picture): 변환이 끝난(DONE) Picture ORM객체
+    Raises:
+        TimeoutError: 렌더링 프로세스 풀이 제한 시간 안에 결과를 주지 못한 경우
+        ValueError: 입력 사진을 읽을 수 없는 경우
+    """
+    with picture.input_pic.open("rb") as f:
+        data = f.read()
+    seed = new_seed()
+    if picture.faces:
+        for _ in range(REROLL_TRIES):
+            if _choice(picture, seed) != (picture.face, picture.sticker):
+                break
+            seed = new_seed()
+    picture.seed = seed
+    # 이전에 고른 얼굴과 스티커를 지워야 새 시드로 다시 고릅니다.
+    picture.placements = None
+    picture.change_format = output_format(picture.input_pic.name)
+    info = {}
+    derivatives = {}
+    change_pic = _generate(picture, data, info, derivatives)
+    _apply_info(picture, info)
+    old_name, old_derivatives = picture.change_pic.name, picture.derivatives
+    _save_render(picture, change_pic, derivatives)
+    picture.save()
+    if old_name:
+        delete_change_pic(old_name, old_derivatives)
+
+
+def process(picture_id):
+    """process 대기중인 작업 하나 처리
+
+    대기(PENDING) 상태인 Picture를 처리중(PROCESSING)으로 바꾸고 선점 시각(claimed_at)을 남긴 뒤 변환사진을 생성합니다.
+    다른 워커가 먼저 선점한 작업은 건너뜁니다. 단계별 처리 시간은 이 프로세스의 히스토그램에 더해집니다.
+
+    Args:
+        picture_id (int): 처리할 Picture의 id
+    Return:
+        (bool): 이 호출에서 작업을 처리했는지 여부
+    """
+    claimed = Picture.objects.filter(id=picture_id, status=Picture.PENDING).update(
+        status=Picture.PROCESSING, claimed_at=timezone.now()
+    )
+    if not claimed:
+        return False
+    picture = Picture.objects.get(id=picture_id)
+    try:
+        with record():
+            render_picture(picture)
+    except Exception:
+        logger.exception("picgen 작업 실패: %s", picture_id)
+        Picture.objects.filter(id=picture_id).update(status=Picture.FAILED)
+    return True
+
+
+def job_timeout():
+    """job_timeout 처리중 작업의 제한 시간
+
+    Return:
+        (timedelta): settings.AI_PROCESS_JOB_TIMEOUT
+    """
+    return timedelta(seconds=getattr(settings, "AI_PROCESS_JOB_TIMEOUT", 300))
+
+
+def requeue_stale():
+    """requeue_stale 멈춘 작업 다시 대기시키기
+
+    선점한 지 job_timeout이 지나도 처리중(PROCESSING)인 작업은 처리하던 워커가 죽은 것으로 보고 대기(PENDING)로 돌립니다.
+
+    Return:
+        (int): 다시 대기시킨 작업의 수
+    """
+    return Picture.objects.filter(
+        status=Picture.PROCESSING, claimed_at__lt=timezone.now() - job_timeout()
+    ).update(status=Picture.PENDING, claimed_at=None)
+
+
+def run_pending():
+    """run_pending 대기중인 작업 모두 처리
+
+    멈춘 작업을 먼저 다시 대기시킨 뒤 처리합니다.
+
+    Return:
+        (int): 처리한 작업의 수
+    """
+    requeue_stale()
+    pending = Picture.objects.filter(status=Picture.PENDING).order_by("id")
+    picture_ids = list(pending.values_list("id", flat=True))
+    return sum(process(picture_id) for picture_id in picture_ids)
+
+
+def _run(picture_id):
+    try:
+        process(picture_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    """get_executor 프로세스 공용 작업 스레드 풀 가져오기
+
+    settings.AI_PROCESS_WORKERS가 0이면 스레드 풀을 만들지 않습니다.
+    이 경우 작업은 picgen_worker 명령어로 띄운 별도 워커가 처리합니다.
+
+    Return:
+        (ThreadPoolExecutor): 작업 스레드 풀. 사용하지 않으면 None
+    """
+    global _executor
+    workers = getattr(settings, "AI_PROCESS_WORKERS", 2)
+    if _executor is None and workers:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="picgen"
+                )
+    return _executor
+
+
+def enqueue(picture):
+    """enqueue 변환 작업 등록
+
+    Picture를 대기 상태로 저장하고, 트랜잭션이 커밋되면 스레드 풀에 작업을 넘깁니다.
+
+    Args:
+        picture (Picture): 변환할 Picture ORM객체
+    """
+    picture.status = Picture.PENDING
+    picture.save(update_fields=["status"])
+    executor = get_executor()
+    if executor is not None:
+        transaction.on_commit(lambda: executor.submit(_run, picture.id))
+
+
+def _recover(executor):
+    try:
+        requeue_stale()
+        pending = Picture.objects.filter(status=Picture.PENDING).order_by("id")
+        for picture_id in pending.values_list("id", flat=True):
+            executor.submit(_run, picture_id)
+    finally:
+        close_old_connections()
+
+
+def recover():
+    """recover 남은 작업 다시 넘기기
+
+    웹 워커의 작업 스레드 풀은 메모리에만 있으므로, 프로세스가 재시작되면 대기중이던 작업이 사라지고
+    처리 도중 죽은 작업은 처리중(PROCESSING)으로 남습니다. 요청이 시작될 때(request_started) 불리며,
+    프로세스의 첫 요청과 그 뒤 job_timeout마다 한 번씩 멈춘 작업을 다시 대기시키고 대기 작업을 스레드 풀에 넘깁니다.
+    DB 조회는 스레드 풀에서 하므로 요청을 늦추지 않습니다.
+    비동기 모드가 아니거나 스레드 풀이 없으면(picgen_worker가 처리) 아무것도 하지 않습니다.
+    """
+    global _recovered_at
+    if not getattr(settings, "AI_PROCESS_PICGEN_ASYNC", False):
+        return
+    executor = get_executor()
+    if executor is None:
+        return
+    now = time.monotonic()
+    with _recover_lock:
+        if (
+            _recovered_at is not None
+            and now - _recovered_at < job_timeout().total_seconds()
+        ):
+            return
+        _recovered_at = now
+    executor.submit(_recover, executor)
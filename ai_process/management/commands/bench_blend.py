@@ -0,0 +1,70 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ai_process.cat import alpha_blend
+
+
+def float_blend(roi, sticker):
+    """float_blend 기존 float64 합성 (비교 기준)
+
+    alpha_blend 도입 전 picture_generator가 사용하던 합성 방식입니다.
+    """
+    alpha = sticker[:, :, 3] / 255.0
+    alpha = np.expand_dims(alpha, axis=2)
+    overlay_rgb = sticker[:, :, :3]
+    roi[:] = (alpha * overlay_rgb + (1.0 - alpha) * roi)[:, :, :3]
+    return roi
+
+
+class Command(BaseCommand):
+    """bench_blend 스티커 합성 마이크로 벤치마크
+
+    기존 float64 합성(float_blend)과 uint8 합성(alpha_blend)의 속도, 최대 메모리, 결과 차이를 비교합니다.
+
+    사용법: python manage.py bench_blend --size 1500 --repeat 20
+    """
+
+    help = "float64 합성과 uint8 alpha_blend의 속도/메모리를 비교합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", type=int, default=1000, help="합성 영역 한 변 길이(px)"
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="반복 횟수")
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        repeat = options["repeat"]
+        rng = np.random.default_rng(0)
+        roi = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        sticker = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+
+        results = {}
+        for name, blend in (("float64", float_blend), ("uint8", alpha_blend)):
+            target = roi.copy()
+            blend(target, sticker)
+            results[name] = target
+
+            elapsed = 0.0
+            for _ in range(repeat):
+                target = roi.copy()
+                start = time.perf_counter()
+                blend(target, sticker)
+                elapsed += time.perf_counter() - start
+
+            target = roi.copy()
+            tracemalloc.start()
+            blend(target, sticker)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{name:8} {elapsed / repeat * 1000:8.2f} ms/회  "
+                f"최대 추가 메모리 {peak / 2**20:8.2f} MiB"
+            )
+
+        diff = np.abs(results["float64"].astype(np.int16) - results["uint8"]).max()
+        self.stdout.write(f"최대 채널 차이: {diff}")
@@ -0,0 +1,115 @@
+import os
+import time
+import cv2
+from django.core.management.base import BaseCommand
+from ai_process.cat import detect_faces, face_boxes
+from ai_process.detectors import DETECTORS, get_detector
+
+
+def iou(a, b):
+    """iou 두 얼굴 박스의 겹침 비율
+
+    Args:
+        a, b (list): [left, top, right, bottom]
+    Return:
+        (float): 교집합 넓이 / 합집합 넓이
+    """
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+def matches(boxes, reference, threshold=0.3):
+    """matches 기준 박스와 겹치는 박스 수
+
+    Args:
+        boxes (list): 비교할 얼굴 박스 리스트
+        reference (list): 기준 얼굴 박스 리스트
+        threshold (float): 같은 얼굴로 볼 최소 IoU
+    Return:
+        (int): reference 중 boxes의 박스 하나와 짝지어진 박스 수
+    """
+    unused = list(boxes)
+    count = 0
+    for ref in reference:
+        best = max(unused, key=lambda box: iou(box, ref), default=None)
+        if best is not None and iou(best, ref) >= threshold:
+            unused.remove(best)
+            count += 1
+    return count
+
+
+class Command(BaseCommand):
+    """bench_detectors 얼굴 탐지기 비교 벤치마크
+
+    폴더의 사진마다 각 얼굴 탐지기의 탐지 시간과 찾은 얼굴 수를 재고,
+    기준 탐지기(--reference)의 얼굴과 IoU로 짝지어 일치율(recall, precision)을 보고합니다.
+    탐지는 실제 요청과 같이 detect_faces의 축소 사본에서 실행합니다.
+
+    사용법: python manage.py bench_detectors static --repeat 5 --reference dlib
+    """
+
+    help = "얼굴 탐지기별 사진당 탐지 시간과 기준 탐지기와의 일치율을 비교합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="사진 폴더")
+        parser.add_argument("--repeat", type=int, default=5, help="사진당 반복 횟수")
+        parser.add_argument(
+            "--reference", default="dlib", choices=sorted(DETECTORS), help="기준 탐지기"
+        )
+        parser.add_argument(
+            "--max-side",
+            type=int,
+            default=None,
+            help="탐지용 축소 사본의 최대 변 길이(px)",
+        )
+
+    def handle(self, *args, **options):
+        names = [options["reference"]] + sorted(set(DETECTORS) - {options["reference"]})
+        for name in names:
+            get_detector(name)
+
+        totals = {name: {"time": 0.0, "faces": 0, "matched": 0} for name in names}
+        reference_faces = 0
+        images = 0
+        for filename in sorted(os.listdir(options["path"])):
+            img = cv2.imread(os.path.join(options["path"], filename))
+            if img is None:
+                continue
+            images += 1
+            results = {}
+            for name in names:
+                start = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    dets = detect_faces(img, options["max_side"], name)
+                elapsed = (time.perf_counter() - start) / options["repeat"]
+                results[name] = face_boxes(dets)
+                totals[name]["time"] += elapsed
+                totals[name]["faces"] += len(results[name])
+                self.stdout.write(
+                    f"{filename:30} {name:6} {elapsed * 1000:8.2f} ms  "
+                    f"얼굴 {len(results[name])}개"
+                )
+            reference = results[options["reference"]]
+            reference_faces += len(reference)
+            for name in names:
+                totals[name]["matched"] += matches(results[name], reference)
+
+        if not images:
+            self.stdout.write("읽을 수 있는 사진이 없습니다.")
+            return
+        self.stdout.write("")
+        for name in names:
+            total = totals[name]
+            recall = total["matched"] / reference_faces if reference_faces else 1.0
+            precision = total["matched"] / total["faces"] if total["faces"] else 1.0
+            self.stdout.write(
+                f"{name:6} 평균 {total['time'] / images * 1000:8.2f} ms/장  "
+                f"얼굴 {total['faces']}개  "
+                f"{options['reference']} 대비 recall {recall:.2f} precision {precision:.2f}"
+            )
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ai_process.stickers import StickerPack
+
+
+class Command(BaseCommand):
+    """build_stickers 스티커 묶음 생성
+
+    AI_PROCESS_STICKER_DIR의 PNG 스티커를 알파가 곱해진 배열 하나(stickers.npy)와 manifest(stickers.json)로 묶어
+    AI_PROCESS_STICKER_PACK 폴더에 저장합니다. 스티커를 추가하거나 바꾼 뒤 배포할 때 실행합니다.
+
+    사용법: python manage.py build_stickers
+    """
+
+    help = "스티커 PNG를 memory-map용 스티커 묶음으로 변환합니다."
+
+    def handle(self, *args, **options):
+        pack = StickerPack.from_dir(settings.AI_PROCESS_STICKER_DIR)
+        pack.save(settings.AI_PROCESS_STICKER_PACK)
+        for entry in pack.manifest:
+            self.stdout.write(
+                f'{entry["id"]:12} {entry["direction"]:6} {entry["width"]}x{entry["height"]}'
+            )
+        self.stdout.write(
+            f"{len(pack.manifest)}개 스티커, {pack.data.nbytes / 2**20:.1f} MiB 저장: "
+            f"{settings.AI_PROCESS_STICKER_PACK}"
+        )
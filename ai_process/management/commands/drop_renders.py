@@ -0,0 +1,61 @@
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ai_process.models import Picture, RenderCache
+
+
+class Command(BaseCommand):
+    """drop_renders 오래된 변환사진 파일 지우기
+
+    오래된 게시글의 변환사진 파일을 지워 media 용량을 줄입니다. DB의 change_pic 경로는 그대로 두며,
+    다음에 그 경로가 요청되면 input_pic과 seed로 같은 사진을 다시 만듭니다(jobs.materialize).
+    너비별 변환사진 파일도 함께 지우고 derivatives를 비워, 게시글 목록은 다시 만들어질 때까지 change_pic만 씁니다.
+    시드가 없는 Picture와 렌더 캐시가 쓰는 변환사진은 지우지 않습니다.
+
+    사용법: python manage.py drop_renders --days 30
+    """
+
+    help = "오래된 게시글의 변환사진 파일을 지웁니다. 요청 시 다시 만들어집니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=30, help="이 기간(일)보다 오래된 게시글만 대상"
+        )
+        parser.add_argument(
+            "--limit", type=int, default=1000, help="한 번에 지울 최대 파일 수"
+        )
+
+    def handle(self, *args, **options):
+        created_before = timezone.now() - timedelta(days=options["days"])
+        pictures = (
+            Picture.objects.filter(
+                article__created_at__lt=created_before,
+                seed__isnull=False,
+                status=Picture.DONE,
+            )
+            .exclude(change_pic="")
+            .exclude(change_pic__in=RenderCache.objects.values("change_pic"))
+            .order_by("change_pic")
+        )
+        dropped = 0
+        freed = 0
+        for name in pictures.values_list("change_pic", flat=True).distinct():
+            if dropped >= options["limit"]:
+                break
+            if not default_storage.exists(name):
+                continue
+            freed += default_storage.size(name)
+            default_storage.delete(name)
+            # 같은 변환사진을 쓰는 Picture들은 너비별 변환사진도 같은 파일을 씁니다.
+            sharing = Picture.objects.filter(change_pic=name)
+            derivatives = set()
+            for picture_derivatives in sharing.values_list("derivatives", flat=True):
+                derivatives.update(picture_derivatives.values())
+            for derivative in derivatives:
+                if default_storage.exists(derivative):
+                    freed += default_storage.size(derivative)
+                    default_storage.delete(derivative)
+            sharing.update(derivatives={})
+            dropped += 1
+        self.stdout.write(f"{dropped}개 변환사진 삭제 ({freed} bytes)")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+from ai_process.ment import ttl
+from ai_process.models import MentCache
+
+
+class Command(BaseCommand):
+    """ment_cache 고양이 멘트 캐시 상태 보기
+
+    MentCache 테이블의 멘트 수, TTL이 지난 멘트 수, 테이블에서 찾은 적중 수를 출력합니다.
+    프로세스 안의 LRU 적중까지 포함한 적중률은 각 프로세스의 ment.stats()로 봅니다.
+    --purge를 주면 TTL이 지난 멘트를 지웁니다.
+
+    사용법: python manage.py ment_cache --purge
+    """
+
+    help = "고양이 멘트 캐시 상태를 출력하고, TTL이 지난 멘트를 지웁니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purge", action="store_true", help="TTL이 지난 멘트 삭제")
+
+    def handle(self, *args, **options):
+        expired = MentCache.objects.filter(created_at__lte=timezone.now() - ttl())
+        entries = MentCache.objects.count()
+        hits = MentCache.objects.aggregate(hits=Sum("hits"))["hits"] or 0
+        # 행 하나는 chat gpt 호출 한 번으로 만들어지므로 적중률은 적중 / (적중 + 행 수)로 어림합니다.
+        rate = hits / (hits + entries) if entries else 0.0
+        self.stdout.write(
+            f"멘트 {entries}개, 만료 {expired.count()}개, 테이블 적중 {hits}회 (적중률 {rate:.1%})"
+        )
+        if options["purge"]:
+            deleted, _ = expired.delete()
+            self.stdout.write(f"{deleted}개 멘트 삭제")
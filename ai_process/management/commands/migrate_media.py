@@ -0,0 +1,102 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ai_process.models import MediaAlias, Picture, RenderCache
+from ai_process.storage import is_content_name
+
+
+class Command(BaseCommand):
+    """migrate_media 이전 경로의 media 파일을 내용 주소 경로로 옮기기
+
+    "%Y/%m/input/", "%Y/%m/change/" 경로의 입력사진, 변환사진, 너비별 변환사진을 storage에 다시 저장해
+    "ab/cd/<sha256>.ext" 경로로 옮기고, Picture와 렌더 캐시의 경로를 바꿉니다.
+    이전 경로는 MediaAlias에 남기므로 이전 URL로 요청해도 새 경로로 보냅니다.
+    이전 파일은 배치마다 DB를 바꾼 뒤에 지우며, 중간에 멈춰도 다시 실행하면 이어서 옮깁니다.
+    파일이 없는 경로(drop_renders로 지운 변환사진)는 그대로 둡니다.
+
+    사용법: python manage.py migrate_media --batch-size 500
+    """
+
+    help = "이전 경로의 media 파일을 내용 주소 경로로 옮깁니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="한 번에 옮길 행 수"
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="옮긴 뒤 이전 파일을 지우지 않음"
+        )
+
+    def handle(self, *args, **options):
+        self.moved = {}
+        self.old_files = []
+        self.missing = 0
+        batch_size = options["batch_size"]
+        pictures = Picture.objects.order_by("id")
+        for start in range(0, pictures.count(), batch_size):
+            with transaction.atomic():
+                for picture in pictures[start : start + batch_size]:
+                    self.move_picture(picture)
+            self.delete_old_files(options["keep"])
+        entries = RenderCache.objects.order_by("id")
+        for start in range(0, entries.count(), batch_size):
+            with transaction.atomic():
+                for entry in entries[start : start + batch_size]:
+                    self.move_render_cache(entry)
+            self.delete_old_files(options["keep"])
+        self.stdout.write(
+            f"{len(self.moved)}개 파일 이동, 파일이 없는 경로 {self.missing}개"
+        )
+
+    def move(self, name):
+        """이전 경로의 파일을 내용 주소 경로로 저장하고 새 경로를 반환합니다."""
+        if not name or is_content_name(name):
+            return name
+        if name in self.moved:
+            return self.moved[name]
+        alias = MediaAlias.objects.filter(old_name=name).first()
+        if alias is not None:
+            self.moved[name] = alias.new_name
+            return alias.new_name
+        if not default_storage.exists(name):
+            self.missing += 1
+            return name
+        with default_storage.open(name, "rb") as f:
+            new_name = default_storage.save(name, f)
+        MediaAlias.objects.create(old_name=name, new_name=new_name)
+        self.moved[name] = new_name
+        self.old_files.append(name)
+        return new_name
+
+    def move_derivatives(self, derivatives):
+        return {width: self.move(name) for width, name in (derivatives or {}).items()}
+
+    def move_picture(self, picture):
+        input_pic = self.move(picture.input_pic.name)
+        change_pic = self.move(picture.change_pic.name)
+        derivatives = self.move_derivatives(picture.derivatives)
+        if (input_pic, change_pic, derivatives) != (
+            picture.input_pic.name,
+            picture.change_pic.name,
+            picture.derivatives,
+        ):
+            Picture.objects.filter(id=picture.id).update(
+                input_pic=input_pic, change_pic=change_pic, derivatives=derivatives
+            )
+
+    def move_render_cache(self, entry):
+        change_pic = self.move(entry.change_pic)
+        info = entry.info
+        if info and info.get("derivatives"):
+            info = {**info, "derivatives": self.move_derivatives(info["derivatives"])}
+        if (change_pic, info) != (entry.change_pic, entry.info):
+            RenderCache.objects.filter(id=entry.id).update(
+                change_pic=change_pic, info=info
+            )
+
+    def delete_old_files(self, keep):
+        # DB의 경로를 모두 바꾼 뒤에 지웁니다.
+        if not keep:
+            for name in self.old_files:
+                default_storage.delete(name)
+        self.old_files = []
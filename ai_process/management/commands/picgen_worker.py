@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from ai_process.jobs import run_pending
+
+
+class Command(BaseCommand):
+    """picgen_worker 비동기 picgen 작업 워커
+
+    대기(PENDING) 상태의 Picture를 주기적으로 찾아 변환사진을 생성합니다.
+    웹 워커 안에 스레드 풀을 두지 않을 때(AI_PROCESS_WORKERS = 0) 별도 프로세스로 실행합니다.
+
+    사용법: python manage.py picgen_worker --interval 1
+    """
+
+    help = "대기중인 picgen 작업을 처리합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="대기 작업 확인 주기(초)"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="대기 작업을 한 번만 처리하고 종료"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending()
+            if count:
+                self.stdout.write(f"{count}개 작업 처리")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from ai_process.sweeper import sweep
+
+
+class Command(BaseCommand):
+    """sweep_pictures 게시글에 붙지 않은 Picture 정리
+
+    picgen으로 만들고 게시글을 작성하지 않은 채 TTL이 지난 Picture 행과 그 파일들을 지웁니다.
+    --interval을 주면 그 주기로 계속 실행하므로 cron 대신 별도 프로세스로 띄울 수 있습니다.
+
+    사용법: python manage.py sweep_pictures --hours 24 --interval 600
+    """
+
+    help = "게시글에 붙지 않은 오래된 Picture와 파일을 지웁니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=None,
+            help="만든 지 이 시간이 지난 Picture만 대상 (기본값 AI_PROCESS_ORPHAN_TTL_HOURS)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="한 번에 지울 Picture 수"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None, help="파일 삭제 스레드 수"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="정리 주기(초). 0이면 한 번만 실행하고 종료",
+        )
+
+    def handle(self, *args, **options):
+        ttl = None if options["hours"] is None else timedelta(hours=options["hours"])
+        while True:
+            rows, files = sweep(ttl, options["batch_size"], options["workers"])
+            self.stdout.write(f"{rows}개 Picture, {files}개 파일 삭제")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,167 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import parse_etags
+from ai_process.storage import is_content_name
+
+# media 파일 반환
+# 내용 주소 파일은 이름이 곧 내용의 sha256이므로 ETag를 따로 계산하지 않고, 브라우저와 프록시가 영구히 캐시하게 합니다.
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# 내용 주소 파일의 캐시 기간(초). immutable과 함께 1년으로 둡니다.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class _RangeFile:
+    # 파일의 start부터 length 바이트만 읽습니다.
+    # fileno가 없으므로 WSGI 서버의 sendfile이 파일 끝까지 보내지 않고 read를 통해 범위만 보냅니다.
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def etag(name):
+    """etag 파일의 강한 ETag
+
+    Args:
+        name (str): storage 경로
+    Return:
+        (str): 내용 주소 파일이면 '"<sha256>"', 아니면 None
+    """
+    if not is_content_name(name):
+        return None
+    return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+
+
+def byte_range(header, size):
+    """byte_range Range 헤더 해석
+
+    "bytes=start-end", "bytes=start-", "bytes=-suffix" 형식의 범위 하나만 지원합니다.
+
+    Args:
+        header (str): Range 헤더 값
+        size (int): 파일 크기(바이트)
+    Return:
+        (tuple): (start, end) 양 끝을 포함하는 범위. 지원하지 않는 형식이면 None (전체 파일 반환)
+    Raises:
+        ValueError: 파일 안에 들어오지 않는 범위인 경우 (416)
+    """
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("범위가 파일 밖입니다.")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("범위가 파일 밖입니다.")
+    return start, end
+
+
+def _not_modified(header, tag):
+    # If-None-Match는 약한 비교를 하므로 W/ 접두사를 떼고 비교합니다.
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or tag in (t.removeprefix("W/") for t in tags)
+
+
+def _accel(name, content_type):
+    # 프런트 웹 서버가 파일을 직접 보내도록 헤더만 담은 응답을 만듭니다. 범위 요청도 웹 서버가 처리합니다.
+    # nginx는 이 응답의 Content-Type, Cache-Control을 그대로 쓰므로 파일 형식을 담아 둡니다.
+    # 한글 등 ASCII가 아닌 이전 경로는 Django가 헤더를 MIME 인코딩해 웹 서버가 찾지 못하므로 URL 인코딩합니다.
+    mode = getattr(settings, "AI_PROCESS_MEDIA_ACCEL", "")
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "AI_PROCESS_MEDIA_ACCEL_PREFIX", "/protected-media/")
+        header, value = "X-Accel-Redirect", prefix + filepath_to_uri(name)
+    elif mode == "x-sendfile":
+        header, value = "X-Sendfile", filepath_to_uri(default_storage.path(name))
+    else:
+        return None
+    response = HttpResponse(content_type=content_type)
+    response[header] = value
+    return response
+
+
+def serve_file(request, name):
+    """serve_file media 파일 응답 만들기
+
+    settings.AI_PROCESS_MEDIA_ACCEL이 "x-accel-redirect"(nginx)나 "x-sendfile"(Apache, lighttpd)이면
+    파일은 프런트 웹 서버가 보내고, 아니면 FileResponse로 storage에서 읽어 보냅니다.
+    내용 주소 파일에는 강한 ETag와 Cache-Control: immutable을 붙이고, If-None-Match와 Range 요청을 처리합니다.
+
+    Args:
+        request (HttpRequest): 요청
+        name (str): storage 경로
+    Return:
+        (HttpResponse): 200 파일, 206 범위, 304 변경 없음, 416 범위 오류 응답
+    Raises:
+        Http404: 파일이 없는 경우
+    """
+    if not default_storage.exists(name):
+        raise Http404("파일이 없습니다.")
+    tag = etag(name)
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if tag is not None and _not_modified(request.headers.get("If-None-Match"), tag):
+        response = HttpResponse(status=304)
+    else:
+        response = _accel(name, content_type)
+    if response is None:
+        size = default_storage.size(name)
+        requested = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if requested and (if_range is None or (tag is not None and if_range == tag)):
+            try:
+                span = byte_range(requested, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+        else:
+            span = None
+        file = default_storage.open(name, "rb")
+        if span is None:
+            response = FileResponse(file, content_type=content_type)
+            response["Content-Length"] = size
+        else:
+            start, end = span
+            length = end - start + 1
+            response = FileResponse(
+                _RangeFile(file, start, length), status=206, content_type=content_type
+            )
+            response["Content-Length"] = length
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Accept-Ranges"] = "bytes"
+    if tag is not None:
+        response["ETag"] = tag
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, "AI_PROCESS_MEDIA_MAX_AGE", 3600),
+        )
+    return response
@@ -0,0 +1,221 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+import openai
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from ai_process.models import MentCache
+
+# chat gpt로 고양이 멘트(cat_says)를 만듭니다.
+# 같은 설명(description)은 프로세스 안의 LRU, 그다음 MentCache 테이블에서 찾고, 없을 때만 API를 호출합니다.
+MODEL = "gpt-3.5-turbo"
+PROMPT = "입력값에 주어진 상황(참고로 이것은 사진의 내용과 연관이 있다옹!)을 지켜보던 고양이가 있다고 가정한다옹. 문장의 화자와 너(고양이)는 다른 객체임을 명확히 인지하라냥! 그 고양이가 화난 이유를 한문장으로 만들어라냥. 웃기고 고양이다운 이유여야한다옹! 부적절한 문장이거나 이해할 수 없다면, 고양이답게 화내고 공격하겠다고 협박해라냥!!"
+# PROMPT를 바꾸면 올려서 이전 프롬프트로 만든 캐시를 쓰지 않게 합니다.
+PROMPT_VERSION = 1
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+
+def normalize(description):
+    """normalize 설명 정규화
+
+    유니코드 정규화(NFKC), 대소문자, 앞뒤와 연속된 공백 차이는 같은 설명으로 봅니다.
+
+    Args:
+        description (str): 사용자가 입력한 설명
+    Return:
+        (str): 정규화한 설명
+    """
+    return " ".join(unicodedata.normalize("NFKC", description).casefold().split())
+
+
+def ment_key(description):
+    """ment_key 멘트 캐시 키 만들기
+
+    Args:
+        description (str): 사용자가 입력한 설명
+    Return:
+        (str): 모델, 프롬프트 버전, 정규화한 설명으로 만든 sha256
+    """
+    text = f"{MODEL}:v{PROMPT_VERSION}:{normalize(description)}"
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def ttl():
+    """ttl 멘트 캐시 유효 기간
+
+    Return:
+        (timedelta): settings.AI_PROCESS_MENT_CACHE_TTL_HOURS
+    """
+    return timedelta(hours=getattr(settings, "AI_PROCESS_MENT_CACHE_TTL_HOURS", 24 * 7))
+
+
+def _count(name):
+    with _lru_lock:
+        _stats[name] += 1
+
+
+def _remember(key, message, created_at):
+    size = getattr(settings, "AI_PROCESS_MENT_CACHE_SIZE", 1024)
+    if not size:
+        return
+    # 만료 시각은 테이블과 맞추기 위해 created_at 기준으로 계산합니다.
+    expires = time.time() + (created_at + ttl() - timezone.now()).total_seconds()
+    with _lru_lock:
+        _lru[key] = (message, expires)
+        _lru.move_to_end(key)
+        while len(_lru) > size:
+            _lru.popitem(last=False)
+
+
+def _recall(key):
+    with _lru_lock:
+        item = _lru.get(key)
+        if item is None:
+            return None
+        message, expires = item
+        if expires <= time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        _stats["memory_hits"] += 1
+        return message
+
+
+def _messages(description):
+    return [
+        {"role": "system", "content": PROMPT},
+        {"role": "user", "content": description},
+    ]
+
+
+def generate(description):
+    """generate 고양이 멘트 생성
+
+    캐시를 보지 않고 chat gpt를 호출합니다.
+
+    Args:
+        description (str): 사용자가 입력한 설명
+    Return:
+        (str): 고양이 멘트
+    """
+    result = openai.ChatCompletion.create(
+        model=MODEL,
+        messages=_messages(description),
+    )
+    return result.choices[0].message.content
+
+
+def _lookup(key):
+    # 프로세스 안의 LRU, MentCache 테이블 순서로 TTL이 지나지 않은 멘트를 찾습니다.
+    message = _recall(key)
+    if message is not None:
+        return message
+    cached = MentCache.objects.filter(
+        key=key, created_at__gt=timezone.now() - ttl()
+    ).first()
+    if cached is None:
+        return None
+    _count("db_hits")
+    MentCache.objects.filter(id=cached.id).update(hits=F("hits") + 1)
+    _remember(key, cached.message, cached.created_at)
+    return cached.message
+
+
+def _store(key, message):
+    cached, _ = MentCache.objects.update_or_create(
+        key=key, defaults={"message": message, "created_at": timezone.now()}
+    )
+    _remember(key, message, cached.created_at)
+
+
+def cat_says(description, fresh=False):
+    """cat_says 캐시를 거쳐 고양이 멘트 가져오기
+
+    프로세스 안의 LRU, MentCache 테이블 순서로 TTL(settings.AI_PROCESS_MENT_CACHE_TTL_HOURS)이 지나지 않은 멘트를 찾고,
+    없으면 chat gpt로 만들어 두 곳에 저장합니다.
+
+    Args:
+        description (str): 사용자가 입력한 설명
+        fresh (bool): 캐시를 보지 않고 새로 만들어 캐시를 바꿀지 여부
+    Return:
+        (tuple): (고양이 멘트, 캐시에서 가져왔는지 여부)
+    """
+    key = ment_key(description)
+    if not fresh:
+        message = _lookup(key)
+        if message is not None:
+            return message, True
+    _count("misses")
+    message = generate(description)
+    _store(key, message)
+    return message, False
+
+
+def stream_cat_says(description, fresh=False):
+    """stream_cat_says 고양이 멘트를 만들어지는 대로 가져오기
+
+    cat_says와 같은 캐시를 쓰며, 캐시에 없으면 chat gpt를 stream=True로 호출해 받은 토큰을 바로 넘깁니다.
+    캐시에 있으면 멘트 전체를 토큰 하나로 넘깁니다. 끝까지 받은 멘트만 캐시에 저장합니다.
+
+    Args:
+        description (str): 사용자가 입력한 설명
+        fresh (bool): 캐시를 보지 않고 새로 만들어 캐시를 바꿀지 여부
+    Return:
+        (generator): ("token", 토큰)을 차례로 넘기고, 마지막에 ("done", (고양이 멘트, 캐시에서 가져왔는지 여부))
+    """
+    key = ment_key(description)
+    if not fresh:
+        message = _lookup(key)
+        if message is not None:
+            yield "token", message
+            yield "done", (message, True)
+            return
+    _count("misses")
+    chunks = openai.ChatCompletion.create(
+        model=MODEL,
+        messages=_messages(description),
+        stream=True,
+    )
+    tokens = []
+    for chunk in chunks:
+        token = chunk.choices[0].delta.get("content")
+        if token:
+            tokens.append(token)
+            yield "token", token
+    message = "".join(tokens)
+    _store(key, message)
+    yield "done", (message, False)
+
+
+def stats():
+    """stats 멘트 캐시 통계
+
+    Return:
+        (dict): 이 프로세스의 memory_hits, db_hits, misses, hit_rate, memory_entries와 테이블의 entries
+    """
+    with _lru_lock:
+        counts = dict(_stats)
+        memory_entries = len(_lru)
+    total = sum(counts.values())
+    hits = counts["memory_hits"] + counts["db_hits"]
+    return {
+        **counts,
+        "hit_rate": hits / total if total else 0.0,
+        "memory_entries": memory_entries,
+        "entries": MentCache.objects.count(),
+    }
+
+
+def clear():
+    """clear 프로세스 안의 LRU와 통계 비우기"""
+    with _lru_lock:
+        _lru.clear()
+        for name in _stats:
+            _stats[name] = 0
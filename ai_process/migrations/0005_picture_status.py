@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0004_picture_author"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "PENDING"),
+                    ("PROCESSING", "PROCESSING"),
+                    ("DONE", "DONE"),
+                    ("FAILED", "FAILED"),
+                ],
+                default="DONE",
+                max_length=10,
+            ),
+        ),
+    ]
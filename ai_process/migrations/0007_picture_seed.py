@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:24
+
+import ai_process.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0006_rendercache"),
+    ]
+
+    operations = [
+        # 기존 Picture는 시드 없이 렌더링되었으므로 None으로 둡니다.
+        migrations.AddField(
+            model_name="picture",
+            name="seed",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="picture",
+            name="seed",
+            field=models.PositiveIntegerField(
+                default=ai_process.models.new_seed, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="rendercache",
+            name="seed",
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
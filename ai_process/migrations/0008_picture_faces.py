@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0007_picture_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="face",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="picture",
+            name="faces",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="picture",
+            name="height",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="picture",
+            name="sticker",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="picture",
+            name="width",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="rendercache",
+            name="info",
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0008_picture_faces"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="mode",
+            field=models.CharField(
+                choices=[("ONE", "ONE"), ("ALL", "ALL")], default="ONE", max_length=10
+            ),
+        ),
+        migrations.AlterField(
+            model_name="picture",
+            name="sticker",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:45
+
+import os
+from django.db import migrations, models
+
+
+def fill_change_format(apps, schema_editor):
+    # 기존 변환사진은 입력사진과 같은 확장자로 저장되어 있습니다.
+    Picture = apps.get_model("ai_process", "Picture")
+    formats = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+    for picture in Picture.objects.exclude(change_pic="").exclude(change_pic=None):
+        ext = os.path.splitext(picture.change_pic.name)[1].lower()
+        if ext in formats:
+            picture.change_format = formats[ext]
+            picture.save(update_fields=["change_format"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0009_picture_mode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="change_format",
+            field=models.CharField(
+                blank=True,
+                choices=[("jpeg", "jpeg"), ("png", "png"), ("webp", "webp")],
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(fill_change_format, migrations.RunPython.noop),
+    ]
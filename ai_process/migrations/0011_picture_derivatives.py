@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0010_picture_change_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="derivatives",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
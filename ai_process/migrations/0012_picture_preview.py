@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0011_picture_derivatives"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="picture",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PREVIEW", "PREVIEW"),
+                    ("PENDING", "PENDING"),
+                    ("PROCESSING", "PROCESSING"),
+                    ("DONE", "DONE"),
+                    ("FAILED", "FAILED"),
+                ],
+                default="DONE",
+                max_length=10,
+            ),
+        ),
+    ]
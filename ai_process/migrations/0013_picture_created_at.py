@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0012_picture_preview"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+    ]
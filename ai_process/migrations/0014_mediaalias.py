@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0013_picture_created_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaAlias",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("old_name", models.CharField(max_length=255, unique=True)),
+                ("new_name", models.CharField(max_length=255)),
+            ],
+        ),
+    ]
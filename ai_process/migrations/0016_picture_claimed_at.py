@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0015_mentcache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="claimed_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
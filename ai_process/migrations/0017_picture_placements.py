@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_process", "0016_picture_claimed_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="picture",
+            name="placements",
+            field=models.JSONField(null=True),
+        ),
+    ]
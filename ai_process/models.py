@@ -1,7 +1,18 @@
+import random
+from django.core.files.storage import default_storage
 from django.db import models
 from user.models import User
 
 
+def new_seed():
+    """new_seed 렌더링 시드 만들기
+
+    Return:
+        (int): Picture.seed로 쓸 31비트 난수
+    """
+    return random.getrandbits(31)
+
+
 class Picture(models.Model):
     """Picture 모델
 
@@ -10,19 +21,187 @@ class Picture(models.Model):
     Attributes:
         input_pic (Image): 입력된 사진
         change_pic (Image): AI가 변환한 사진
+        statuses (tuple): 변환 작업 상태의 종류를 지정
+        status (str): 변환 작업 상태(미리보기/대기/처리중/완료/실패). 비동기 picgen에서 작업 큐로 사용됩니다.
+            미리보기(PREVIEW)만 만든 Picture는 게시글에 붙일 때 전체 해상도로 변환됩니다.
+        seed (int): 얼굴/스티커 선택에 쓰는 렌더링 시드. input_pic과 seed로 change_pic을 똑같이 다시 만들 수 있습니다.
+            시드가 도입되기 전에 만든 Picture는 None이며 다시 만들 수 없습니다.
+        width (int): 입력사진 너비
+        height (int): 입력사진 높이
+        faces (list): 탐지한 얼굴 박스([left, top, right, bottom]) 리스트. 스티커를 다시 고를 때 얼굴 탐지를 건너뜁니다.
+        face (int): 스티커를 붙인 얼굴의 faces 내 번호. 붙이지 못했으면 None
+        sticker (str): 붙인 스티커의 id. 모든 얼굴 모드에서는 스티커 id들을 쉼표로 이은 문자열
+        placements (list): 붙인 [얼굴 번호, 스티커 id] 리스트. 다시 렌더링할 때 rng로 고르지 않고 같은 얼굴에 같은 스티커를 붙입니다.
+        modes (tuple): 스티커를 붙일 얼굴 모드의 종류를 지정
+        mode (str): 얼굴 하나(ONE)에만, 또는 모든 얼굴(ALL)에 겹치지 않게 스티커를 붙일지 여부
+        formats (tuple): 변환사진 인코딩 형식의 종류를 지정
+        change_format (str): 변환사진의 인코딩 형식(jpeg/png/webp). 다시 만들 때도 이 형식을 씁니다.
+        derivatives (dict): 너비별로 줄인 변환사진의 storage 경로 ({"320": 경로, ...}). 게시글 목록에서 사용합니다.
+        created_at (date): 생성일자. 게시글에 붙지 않은 Picture는 sweep_pictures 명령어가 TTL이 지나면 지웁니다.
+        claimed_at (date): 워커가 작업을 선점(PROCESSING)한 시각. 오래 끝나지 않은 작업은 다시 대기 상태로 돌립니다.
     """
 
+    PREVIEW = "PREVIEW"
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    ONE_FACE = "ONE"
+    ALL_FACES = "ALL"
+    JPEG = "jpeg"
+    PNG = "png"
+    WEBP = "webp"
+
     input_pic = models.ImageField(upload_to="%Y/%m/input/")
     change_pic = models.ImageField(upload_to="%Y/%m/change/", null=True)
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="picture_set"
     )
+    statuses = (
+        (PREVIEW, PREVIEW),
+        (PENDING, PENDING),
+        (PROCESSING, PROCESSING),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    )
+    status = models.CharField(choices=statuses, max_length=10, default=DONE)
+    seed = models.PositiveIntegerField(null=True, default=new_seed)
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    faces = models.JSONField(null=True)
+    face = models.PositiveSmallIntegerField(null=True)
+    sticker = models.CharField(max_length=255, blank=True, default="")
+    placements = models.JSONField(null=True)
+    modes = (
+        (ONE_FACE, ONE_FACE),
+        (ALL_FACES, ALL_FACES),
+    )
+    mode = models.CharField(choices=modes, max_length=10, default=ONE_FACE)
+    formats = (
+        (JPEG, JPEG),
+        (PNG, PNG),
+        (WEBP, WEBP),
+    )
+    change_format = models.CharField(choices=formats, max_length=10, blank=True)
+    derivatives = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True)
 
     def delete(self):
         """Picture.delete Picture모델 및 하위 이미지 삭제
 
         Picture모델이 삭제될 때, 이미지필드의 경로에 해당하는 이미지들도 media 폴더에서 삭제됩니다.
+        변환사진을 렌더 캐시나 다른 Picture가 함께 쓰고 있으면 변환사진 파일(너비별 파일 포함)은 남겨 둡니다.
+        같은 내용의 입력사진은 파일 하나를 함께 쓰므로, 다른 Picture가 쓰는 입력사진 파일도 남겨 둡니다.
         """
-        self.change_pic.delete(save=False)
-        self.input_pic.delete(save=False)
+        if self.change_pic:
+            delete_change_pic(self.change_pic.name, self.derivatives, self.id)
+        if self.input_pic and not input_pic_in_use(self.input_pic.name, self.id):
+            self.input_pic.delete(save=False)
         super(Picture, self).delete()
+
+
+class RenderCache(models.Model):
+    """RenderCache 모델
+
+    같은 사진이 다시 업로드되면 다시 변환하지 않고 이전 변환사진 파일을 함께 쓰기 위한 캐시입니다.
+
+    Attributes:
+        key (str): 입력사진 바이트의 sha256, 출력 형식과 품질, 얼굴 모드, 얼굴 탐지기, 렌더러 버전으로 만든 키
+        change_pic (str): 캐시된 변환사진의 storage 경로
+        size (int): 변환사진 파일 크기(바이트). 캐시 용량 제한에 사용합니다.
+        seed (int): 변환사진을 만든 렌더링 시드. 캐시를 쓰는 Picture는 이 시드를 이어받습니다.
+        info (dict): 변환사진의 렌더링 정보(width, height, faces, face, sticker, placements, derivatives). 캐시를 쓰는 Picture에 복사합니다.
+        hits (int): 캐시 적중 수
+        created_at (date): 생성일자
+        last_used_at (date): 마지막 사용일자. 용량 초과 시 오래된 것부터 지웁니다.
+    """
+
+    key = models.CharField(max_length=100, unique=True)
+    change_pic = models.CharField(max_length=255, db_index=True)
+    size = models.PositiveIntegerField()
+    seed = models.PositiveIntegerField(null=True)
+    info = models.JSONField(null=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class MediaAlias(models.Model):
+    """MediaAlias 모델
+
+    migrate_media 명령어로 내용 주소 경로로 옮긴 파일의 이전 경로입니다.
+    이전 경로로 요청하면 새 경로로 보냅니다.
+
+    Attributes:
+        old_name (str): 옮기기 전의 storage 경로
+        new_name (str): 옮긴 뒤의 storage 경로 (ab/cd/<sha256>.ext)
+    """
+
+    old_name = models.CharField(max_length=255, unique=True)
+    new_name = models.CharField(max_length=255)
+
+
+class MentCache(models.Model):
+    """MentCache 모델
+
+    Mentgen view가 만든 고양이 멘트를 설명별로 저장해, 같은 설명은 chat gpt를 다시 호출하지 않습니다.
+
+    Attributes:
+        key (str): 모델, 프롬프트 버전, 정규화한 설명으로 만든 sha256
+        message (str): 고양이 멘트
+        hits (int): 캐시 적중 수
+        created_at (date): 생성일자. TTL이 지나면 다시 만듭니다.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    message = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+def input_pic_in_use(name, exclude_picture_id=None):
+    """input_pic_in_use 입력사진 파일 사용 여부
+
+    Args:
+        name (str): 입력사진의 storage 경로
+        exclude_picture_id (int): 확인에서 제외할 Picture의 id (삭제중인 Picture)
+    Return:
+        (bool): 다른 Picture가 같은 입력사진 파일을 쓰고 있는지 여부
+    """
+    return (
+        Picture.objects.filter(input_pic=name).exclude(id=exclude_picture_id).exists()
+    )
+
+
+def change_pic_in_use(name, exclude_picture_id=None):
+    """change_pic_in_use 변환사진 파일 사용 여부
+
+    Args:
+        name (str): 변환사진의 storage 경로
+        exclude_picture_id (int): 확인에서 제외할 Picture의 id (삭제중인 Picture)
+    Return:
+        (bool): 렌더 캐시나 다른 Picture가 이 파일을 쓰고 있는지 여부
+    """
+    pictures = Picture.objects.filter(change_pic=name).exclude(id=exclude_picture_id)
+    return pictures.exists() or RenderCache.objects.filter(change_pic=name).exists()
+
+
+def delete_change_pic(name, derivatives=None, exclude_picture_id=None):
+    """delete_change_pic 쓰지 않는 변환사진 파일 삭제
+
+    렌더 캐시나 다른 Picture가 쓰지 않으면 변환사진과 너비별 변환사진 파일을 삭제합니다.
+
+    Args:
+        name (str): 변환사진의 storage 경로
+        derivatives (dict): 너비별 변환사진의 storage 경로 (Picture.derivatives)
+        exclude_picture_id (int): 사용 여부 확인에서 제외할 Picture의 id (삭제중인 Picture)
+    Return:
+        (bool): 파일을 삭제했는지 여부
+    """
+    if change_pic_in_use(name, exclude_picture_id):
+        return False
+    default_storage.delete(name)
+    for derivative in (derivatives or {}).values():
+        default_storage.delete(derivative)
+    return True
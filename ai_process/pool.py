@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import random
+import signal
+import threading
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from django.conf import settings
+from ai_process.timing import Stage
+
+# 이미지 렌더링 전용 프로세스 풀입니다.
+# 웹 워커는 이미지를 pickle하지 않고 공유 메모리에 복사해 넘기며, 렌더링 프로세스는 그 메모리에 직접 합성합니다.
+_pool = None
+_pool_lock = threading.Lock()
+# 공유 메모리 앞부분에 렌더링 프로세스의 pid를 적는 영역(바이트)
+HEADER_BYTES = 8
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from ai_process.cat import warm_up
+
+    warm_up()
+
+
+def _render_shared(name, shape, dtype, state, faces, all_faces, placements):
+    from ai_process.cat import render
+
+    rng = random.Random()
+    rng.setstate(state)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # 시간 초과 시 웹 워커가 이 프로세스를 종료할 수 있도록 pid를 남깁니다.
+        header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+        header[0] = os.getpid()
+        img = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=HEADER_BYTES)
+        info = {}
+        render(
+            img,
+            rng,
+            faces=faces,
+            info=info,
+            all_faces=all_faces,
+            placements=placements,
+        )
+        del header, img
+    finally:
+        shm.close()
+    return info
+
+
+def _kill(pid):
+    # 렌더링 프로세스를 종료합니다. Pool이 종료된 프로세스 대신 새 프로세스를 띄웁니다.
+    try:
+        os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+    except ProcessLookupError:
+        pass
+
+
+class RenderPool:
+    """RenderPool 렌더링 프로세스 풀
+
+    CPU를 많이 쓰는 스티커 렌더링을 별도 프로세스에서 실행해, 요청 처리 스레드와 GIL을 다투지 않게 합니다.
+    각 렌더링 프로세스는 max_jobs개의 작업을 처리하면 새 프로세스로 교체되어 dlib의 메모리 증가를 막습니다.
+
+    Attributes:
+        size (int): 렌더링 프로세스 수
+        max_jobs (int): 렌더링 프로세스 하나가 교체되기 전까지 처리할 작업 수
+        timeout (float): 렌더링 결과를 기다릴 최대 시간(초)
+    """
+
+    def __init__(self, size, max_jobs=100, timeout=30):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        # 렌더링 프로세스가 웹 워커와 같은 resource tracker를 쓰도록 먼저 띄워 둡니다.
+        # 그래야 교체되는 렌더링 프로세스가 사용중인 공유 메모리를 지우지 않습니다.
+        resource_tracker.ensure_running()
+        # 스레드가 도는 웹 워커를 직접 fork하지 않도록 forkserver로 렌더링 프로세스를 만듭니다.
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = multiprocessing.get_context()
+        self._pool = context.Pool(
+            processes=size, initializer=_init_worker, maxtasksperchild=max_jobs
+        )
+
+    def render(
+        self, img, rng=random, faces=None, info=None, all_faces=False, placements=None
+    ):
+        """RenderPool.render 렌더링 프로세스에서 스티커 합성
+
+        cat.render와 같은 방식으로 사용합니다. 이미지를 공유 메모리에 복사해 렌더링 프로세스에 넘기고,
+        결과가 나올 때까지 기다린 뒤 img에 다시 복사합니다.
+        렌더링 프로세스 안의 단계는 측정할 수 없으므로 복사와 대기를 포함한 전체 시간을 pool 단계로 기록합니다.
+        난수 생성기의 상태를 그대로 넘기므로 같은 rng로 cat.render를 호출한 결과와 같습니다.
+
+        Args:
+            img (ndarray): BGR 이미지. 이 배열에 결과가 복사됩니다.
+            rng (random.Random): 얼굴/스티커 선택에 사용할 난수 생성기. 상태만 렌더링 프로세스에 넘기며 rng는 진행되지 않습니다.
+            faces (list): 이전에 탐지한 얼굴 박스 리스트. None이면 렌더링 프로세스에서 얼굴을 탐지합니다.
+            info (dict): 넘기면 렌더링 정보를 채웁니다. (cat.render 참고)
+            all_faces (bool): 모든 얼굴에 스티커를 붙일지 여부 (cat.render 참고)
+            placements (list): 이전에 고른 [얼굴 번호, 스티커 id] 리스트 (cat.render 참고)
+        Return:
+            (ndarray): 합성된 이미지
+        Raises:
+            TimeoutError: timeout 안에 렌더링이 끝나지 않은 경우. 그 작업을 처리하던 렌더링 프로세스는 종료되고 새로 뜹니다.
+        """
+        with Stage("pool"):
+            state = rng.getstate()
+            shm = shared_memory.SharedMemory(
+                create=True, size=HEADER_BYTES + img.nbytes
+            )
+            try:
+                header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+                header[0] = 0
+                shared = np.ndarray(
+                    img.shape, dtype=img.dtype, buffer=shm.buf, offset=HEADER_BYTES
+                )
+                shared[...] = img
+                result = self._pool.apply_async(
+                    _render_shared,
+                    (
+                        shm.name,
+                        img.shape,
+                        img.dtype.str,
+                        state,
+                        faces,
+                        all_faces,
+                        placements,
+                    ),
+                )
+                try:
+                    rendered = result.get(self.timeout)
+                except multiprocessing.TimeoutError:
+                    # 버려진 작업이 렌더링 프로세스를 계속 차지하지 않도록 그 프로세스를 종료합니다.
+                    # 아직 시작되지 않은 작업은 지운 공유 메모리를 열지 못해 바로 실패합니다.
+                    pid = int(header[0])
+                    if pid and not result.ready():
+                        _kill(pid)
+                    del header, shared
+                    raise TimeoutError("이미지 렌더링 시간이 초과되었습니다.")
+                img[...] = shared
+                del header, shared
+                if info is not None:
+                    info.update(rendered)
+            finally:
+                shm.close()
+                shm.unlink()
+        return img
+
+    def close(self):
+        """RenderPool.close 렌더링 프로세스 종료"""
+        self._pool.terminate()
+        self._pool.join()
+
+
+def get_pool():
+    """get_pool 프로세스 공용 렌더링 풀 가져오기
+
+    settings.AI_PROCESS_POOL_SIZE가 0이면 풀을 만들지 않고, 렌더링은 요청을 처리하는 스레드에서 실행됩니다.
+
+    Return:
+        (RenderPool): 렌더링 풀. 사용하지 않으면 None
+    """
+    global _pool
+    size = getattr(settings, "AI_PROCESS_POOL_SIZE", 0)
+    if _pool is None and size:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RenderPool(
+                    size,
+                    max_jobs=getattr(settings, "AI_PROCESS_POOL_MAX_JOBS", 100),
+                    timeout=getattr(settings, "AI_PROCESS_POOL_TIMEOUT", 30),
+                )
+    return _pool
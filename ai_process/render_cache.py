@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, Sum
+from django.utils import timezone
+from ai_process.cat import RENDERER_VERSION
+from ai_process.models import RenderCache, delete_change_pic
+
+# 같은 입력사진의 변환 결과를 재사용하는 렌더 캐시입니다.
+# 적중률은 프로세스별로 집계합니다.
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def render_key(data, fmt, mode):
+    """render_key 렌더 캐시 키 만들기
+
+    Args:
+        data (bytes): 입력사진 파일의 내용
+        fmt (str): 출력 형식 (cat.encode 참고)
+        mode (str): 스티커를 붙일 얼굴 모드 (Picture.mode)
+    Return:
+        (str): 입력 바이트의 sha256, 출력 형식과 품질, 얼굴 모드, 얼굴 탐지기, 렌더러 버전으로 만든 키
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    quality = getattr(settings, "AI_PROCESS_OUTPUT_QUALITY", 85)
+    detector = getattr(settings, "AI_PROCESS_DETECTOR", "dlib")
+    return f"{digest}:{fmt}q{quality}:{mode}:{detector}:v{RENDERER_VERSION}"
+
+
+def _enabled():
+    return bool(getattr(settings, "AI_PROCESS_RENDER_CACHE_BYTES", 0))
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def lookup(key):
+    """lookup 렌더 캐시 조회
+
+    Args:
+        key (str): render_key로 만든 키
+    Return:
+        (RenderCache): 캐시된 변환사진의 storage 경로(change_pic), 시드(seed), 렌더링 정보(info). 없으면 None
+    """
+    if not _enabled():
+        return None
+    entry = RenderCache.objects.filter(key=key).first()
+    if entry is None or not default_storage.exists(entry.change_pic):
+        _count("misses")
+        return None
+    RenderCache.objects.filter(id=entry.id).update(
+        hits=F("hits") + 1, last_used_at=timezone.now()
+    )
+    _count("hits")
+    return entry
+
+
+def store(key, name, size, seed=None, info=None):
+    """store 렌더 캐시 저장
+
+    변환사진을 캐시에 등록하고, 캐시 용량(settings.AI_PROCESS_RENDER_CACHE_BYTES)을 넘으면
+    마지막 사용일자가 오래된 것부터 지웁니다.
+
+    Args:
+        key (str): render_key로 만든 키
+        name (str): 변환사진의 storage 경로
+        size (int): 변환사진 파일 크기(바이트)
+        seed (int): 변환사진을 만든 렌더링 시드
+        info (dict): 변환사진의 렌더링 정보 (cat.render 참고)
+    """
+    if not _enabled():
+        return
+    updated = RenderCache.objects.filter(key=key).update(
+        change_pic=name,
+        size=size,
+        seed=seed,
+        info=info,
+        last_used_at=timezone.now(),
+    )
+    if not updated:
+        # 같은 사진을 동시에 변환한 다른 요청이 먼저 저장했으면 그 캐시를 유지합니다.
+        RenderCache.objects.bulk_create(
+            [RenderCache(key=key, change_pic=name, size=size, seed=seed, info=info)],
+            ignore_conflicts=True,
+        )
+    evict(settings.AI_PROCESS_RENDER_CACHE_BYTES)
+
+
+def evict(max_bytes):
+    """evict 렌더 캐시 용량 맞추기
+
+    캐시된 변환사진의 총 크기가 max_bytes 이하가 될 때까지 오래된 캐시를 지웁니다.
+    어떤 Picture도 쓰지 않는 변환사진 파일(너비별 파일 포함)은 함께 삭제합니다.
+
+    Args:
+        max_bytes (int): 캐시 최대 용량(바이트)
+    Return:
+        (int): 지운 캐시 수
+    """
+    total = RenderCache.objects.aggregate(total=Sum("size"))["total"] or 0
+    evicted = 0
+    for entry in RenderCache.objects.order_by("last_used_at", "id").iterator():
+        if total <= max_bytes:
+            break
+        entry.delete()
+        delete_change_pic(entry.change_pic, (entry.info or {}).get("derivatives"))
+        total -= entry.size
+        evicted += 1
+    return evicted
+
+
+def stats():
+    """stats 렌더 캐시 통계
+
+    Return:
+        (dict): 이 프로세스의 hits, misses, hit_rate와 캐시 전체의 entries, bytes
+    """
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    summary = RenderCache.objects.aggregate(bytes=Sum("size"))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "entries": RenderCache.objects.count(),
+        "bytes": summary["bytes"] or 0,
+    }
@@ -6,9 +6,23 @@ class PictureSerializer(serializers.ModelSerializer):
     """PictureSerializer
 
     Picgen view 에서 반환을 위한 시리얼라이저입니다.
+    입력으로는 input_pic과 얼굴 모드(mode)를 받고, 렌더링 정보는 읽기 전용으로 반환합니다.
+    작업 큐의 내부 상태인 선점 시각(claimed_at)은 입력받거나 반환하지 않습니다.
     """
 
     class Meta:
         model = Picture
-        fields = "__all__"
+        exclude = ("claimed_at",)
+        read_only_fields = (
+            "status",
+            "seed",
+            "width",
+            "height",
+            "faces",
+            "face",
+            "sticker",
+            "placements",
+            "change_format",
+            "derivatives",
+        )
         extra_kwargs = {"author": {"read_only": True}}
@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 스티커 파일 이름의 앞부분으로 스티커를 붙일 방향을 정합니다. (예: left_cat1.png -> left)
+DIRECTION_PREFIXES = {
+    "up": "top",
+    "top": "top",
+    "left": "left",
+    "right": "right",
+    "under": "under",
+}
+
+_pack = None
+_pack_lock = threading.Lock()
+_resize_cache = None
+
+
+def premultiply(img):
+    """premultiply 스티커 알파 곱하기
+
+    BGRA 스티커의 색상 채널에 알파를 미리 곱해 둡니다. 합성할 때 스티커 쪽 곱셈을 생략할 수 있고,
+    resize할 때 투명한 픽셀의 색이 가장자리에 번지지 않습니다.
+
+    Args:
+        img (ndarray): 스티커 이미지 (h, w, 4) 또는 알파가 없는 (h, w, 3), uint8
+    Return:
+        (ndarray): 알파가 곱해진 스티커 이미지 (h, w, 4), uint8
+    """
+    if img.shape[2] == 3:
+        alpha = np.full(img.shape[:2], 255, dtype=np.uint8)
+    else:
+        alpha = img[:, :, 3]
+    bgr = cv2.multiply(img[:, :, :3], cv2.merge((alpha, alpha, alpha)), scale=1 / 255)
+    return np.dstack((bgr, alpha))
+
+
+class StickerPack:
+    """StickerPack 스티커 묶음
+
+    알파가 곱해진 스티커들을 하나의 1차원 uint8 배열에 이어 붙이고, manifest로 각 스티커의 위치를 찾습니다.
+    build_stickers 명령어로 만든 .npy 파일은 프로세스마다 한 번 memory-map 되어, fork된 워커들이 읽기 전용으로 공유합니다.
+
+    Attributes:
+        data (ndarray): 모든 스티커를 이어 붙인 1차원 uint8 배열
+        manifest (list): 스티커 정보(id, direction, width, height, offset) 딕셔너리의 리스트
+        directions (dict): 방향별 스티커 정보 리스트
+        ids (dict): id별 스티커 정보
+    """
+
+    def __init__(self, data, manifest):
+        self.data = data
+        self.manifest = manifest
+        self.directions = {}
+        self.ids = {}
+        for entry in manifest:
+            self.directions.setdefault(entry["direction"], []).append(entry)
+            self.ids[entry["id"]] = entry
+
+    @classmethod
+    def from_dir(cls, src_dir):
+        """StickerPack.from_dir 스티커 PNG 폴더로 묶음 만들기
+
+        src_dir의 PNG 중 파일 이름이 DIRECTION_PREFIXES로 시작하는 것만 이름순으로 묶습니다.
+
+        Args:
+            src_dir (str): 스티커 PNG 폴더
+        Return:
+            (StickerPack): 메모리에 만든 스티커 묶음
+        """
+        chunks = []
+        manifest = []
+        offset = 0
+        for filename in sorted(os.listdir(src_dir)):
+            name, ext = os.path.splitext(filename)
+            direction = DIRECTION_PREFIXES.get(name.split("_")[0])
+            if ext.lower() != ".png" or direction is None:
+                continue
+            img = cv2.imread(os.path.join(src_dir, filename), cv2.IMREAD_UNCHANGED)
+            sticker = premultiply(img)
+            height, width = sticker.shape[:2]
+            manifest.append(
+                {
+                    "id": name,
+                    "direction": direction,
+                    "width": width,
+                    "height": height,
+                    "offset": offset,
+                }
+            )
+            chunks.append(sticker.ravel())
+            offset += sticker.size
+        data = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint8)
+        return cls(data, manifest)
+
+    @classmethod
+    def load(cls, pack_dir):
+        """StickerPack.load 저장된 스티커 묶음 불러오기
+
+        Args:
+            pack_dir (str): stickers.npy와 stickers.json이 있는 폴더
+        Return:
+            (StickerPack): memory-map된 스티커 묶음
+        """
+        with open(os.path.join(pack_dir, "stickers.json"), encoding="utf-8") as f:
+            manifest = json.load(f)["stickers"]
+        data = np.load(os.path.join(pack_dir, "stickers.npy"), mmap_mode="r")
+        return cls(data, manifest)
+
+    def save(self, pack_dir):
+        """StickerPack.save 스티커 묶음 저장
+
+        Args:
+            pack_dir (str): stickers.npy와 stickers.json을 저장할 폴더
+        """
+        os.makedirs(pack_dir, exist_ok=True)
+        np.save(os.path.join(pack_dir, "stickers.npy"), np.asarray(self.data))
+        with open(os.path.join(pack_dir, "stickers.json"), "w", encoding="utf-8") as f:
+            json.dump({"stickers": self.manifest}, f, ensure_ascii=False, indent=2)
+
+    def image(self, entry):
+        """StickerPack.image 스티커 이미지 가져오기
+
+        Args:
+            entry (dict): manifest의 스티커 정보
+        Return:
+            (ndarray): 알파가 곱해진 스티커 이미지 (h, w, 4). 읽기 전용 view입니다.
+        """
+        size = entry["height"] * entry["width"] * 4
+        chunk = self.data[entry["offset"] : entry["offset"] + size]
+        return chunk.reshape(entry["height"], entry["width"], 4)
+
+
+def get_pack():
+    """get_pack 프로세스 공용 스티커 묶음 가져오기
+
+    settings.AI_PROCESS_STICKER_PACK 폴더에 build_stickers로 만든 묶음이 있으면 memory-map하고,
+    없으면 settings.AI_PROCESS_STICKER_DIR의 PNG를 한 번 디코딩해 메모리에 둡니다.
+
+    Return:
+        (StickerPack): 스티커 묶음
+    """
+    global _pack
+    if _pack is None:
+        with _pack_lock:
+            if _pack is None:
+                pack_dir = settings.AI_PROCESS_STICKER_PACK
+                if os.path.exists(os.path.join(pack_dir, "stickers.npy")):
+                    _pack = StickerPack.load(pack_dir)
+                else:
+                    logger.info("스티커 묶음이 없어 PNG에서 만듭니다: %s", pack_dir)
+                    _pack = StickerPack.from_dir(settings.AI_PROCESS_STICKER_DIR)
+    return _pack
+
+
+class ResizeCache:
+    """ResizeCache 크기별 스티커 캐시
+
+    resize한 스티커를 (스티커 id, bucket 단위로 올림한 크기)를 키로 LRU 방식으로 보관합니다.
+    요청한 크기와 bucket 크기의 차이(bucket px 미만)는 가운데를 기준으로 잘라내 맞추므로 복사가 없습니다.
+    얼굴 크기가 비슷한 요청이 많아 resize를 대부분 건너뛸 수 있습니다.
+
+    Attributes:
+        max_bytes (int): 캐시가 보관할 스티커의 최대 총 바이트 수
+        bucket (int): 크기를 올림할 단위(px). 0이면 요청한 크기 그대로 캐시합니다.
+        hits (int): 캐시 적중 수
+        misses (int): 캐시 실패(resize 실행) 수
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, bucket=8):
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _quantize(self, size):
+        if not self.bucket:
+            return size
+        return -(-size // self.bucket) * self.bucket
+
+    def get(self, pack, entry, width, height):
+        """ResizeCache.get 크기를 맞춘 스티커 가져오기
+
+        Args:
+            pack (StickerPack): 스티커 묶음
+            entry (dict): manifest의 스티커 정보
+            width, height (int): 필요한 스티커 크기
+        Return:
+            (ndarray): (height, width, 4) 크기의 알파가 곱해진 스티커. 읽기 전용입니다.
+        """
+        key = (entry["id"], self._quantize(width), self._quantize(height))
+        with self._lock:
+            resized = self._items.get(key)
+            if resized is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if resized is None:
+            resized = cv2.resize(pack.image(entry), dsize=key[1:])
+            resized.flags.writeable = False
+            self._put(key, resized)
+        return fit(resized, width, height)
+
+    def _put(self, key, resized):
+        if resized.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = resized
+            self.nbytes += resized.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def stats(self):
+        """ResizeCache.stats 캐시 통계
+
+        Return:
+            (dict): hits, misses, hit_rate, entries, bytes
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._items),
+                "bytes": self.nbytes,
+            }
+
+
+def fit(sticker, width, height):
+    """fit 스티커 크기 맞추기
+
+    가운데를 기준으로 잘라 (height, width) 크기로 맞춥니다. 복사 없이 view를 반환합니다.
+
+    Args:
+        sticker (ndarray): 알파가 곱해진 스티커 (h, w, 4). (height, width) 이상이어야 합니다.
+        width, height (int): 맞출 크기
+    Return:
+        (ndarray): (height, width, 4) 크기의 스티커
+    """
+    h, w = sticker.shape[:2]
+    top = (h - height) // 2
+    left = (w - width) // 2
+    return sticker[top : top + height, left : left + width]
+
+
+def get_resize_cache():
+    """get_resize_cache 프로세스 공용 스티커 크기 캐시 가져오기
+
+    Return:
+        (ResizeCache): settings.AI_PROCESS_STICKER_CACHE_BYTES, AI_PROCESS_STICKER_BUCKET으로 만든 캐시
+    """
+    global _resize_cache
+    if _resize_cache is None:
+        with _pack_lock:
+            if _resize_cache is None:
+                _resize_cache = ResizeCache(
+                    max_bytes=getattr(
+                        settings, "AI_PROCESS_STICKER_CACHE_BYTES", 64 * 2**20
+                    ),
+                    bucket=getattr(settings, "AI_PROCESS_STICKER_BUCKET", 8),
+                )
+    return _resize_cache
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import re
+import tempfile
+from urllib.parse import urljoin
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils._os import safe_join
+from django.utils.encoding import filepath_to_uri
+from django.utils.module_loading import import_string
+
+# 내용 주소 파일 이름: sha256 앞 두 글자, 다음 두 글자로 나눈 폴더 아래 "sha256.확장자"
+CONTENT_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[0-9a-z]+)?$")
+
+
+def is_content_name(name):
+    """is_content_name 내용 주소 파일 이름인지 확인
+
+    Args:
+        name (str): storage 경로
+    Return:
+        (bool): ContentAddressedStorage가 만든 "ab/cd/<sha256>.ext" 형식인지 여부
+    """
+    return bool(CONTENT_NAME.match(name))
+
+
+class LocalObjectStore:
+    """LocalObjectStore 로컬 파일시스템 객체 저장소
+
+    ContentAddressedStorage 뒤에 두는 객체 저장소의 기본 구현입니다. 키를 location 아래 경로로 씁니다.
+    원격 객체 저장소는 같은 메서드(exists, put, open, delete, size, url)를 구현해
+    settings.STORAGES의 store 옵션으로 지정하며, 이 클래스는 그 대역으로도 씁니다.
+
+    Attributes:
+        location (str): 파일을 저장할 폴더. 기본값은 settings.MEDIA_ROOT
+        base_url (str): 파일 URL의 앞부분. 기본값은 settings.MEDIA_URL
+    """
+
+    def __init__(self, location=None, base_url=None):
+        self._location = location
+        self._base_url = base_url
+
+    # 기본값은 사용할 때마다 settings에서 읽으므로 MEDIA_ROOT를 바꾸면(테스트의 override_settings) 바로 따릅니다.
+    @property
+    def location(self):
+        return os.path.abspath(self._location or settings.MEDIA_ROOT)
+
+    @property
+    def base_url(self):
+        return self._base_url or settings.MEDIA_URL
+
+    def path(self, key):
+        return safe_join(self.location, key)
+
+    def exists(self, key):
+        # 폴더는 객체가 아니므로 파일만 있다고 봅니다.
+        return os.path.isfile(self.path(key))
+
+    def put(self, key, content):
+        """LocalObjectStore.put 객체 저장
+
+        임시 파일에 다 쓴 뒤 이름을 바꾸므로, 같은 키를 동시에 저장해도 읽는 쪽은 완성된 파일만 봅니다.
+
+        Args:
+            key (str): 객체 키
+            content (File): 저장할 내용
+        """
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(tmp, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def open(self, key, mode="rb"):
+        return File(open(self.path(key), mode))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def url(self, key):
+        return urljoin(self.base_url, filepath_to_uri(key))
+
+
+class ContentAddressedStorage(Storage):
+    """ContentAddressedStorage 내용 주소 media storage
+
+    파일을 내용의 sha256으로 "ab/cd/<sha256>.ext"에 저장합니다. 폴더 하나에 파일이 많이 쌓이지 않고,
+    같은 내용은 한 번만 저장됩니다. 저장할 때 받은 이름은 확장자만 쓰고 upload_to의 폴더는 무시합니다.
+    같은 파일을 여러 행이 함께 쓸 수 있으므로 파일을 지우는 쪽은 다른 행이 쓰는지 확인해야 합니다.
+    내용 주소가 아닌 이전 경로도 그대로 열 수 있으며, migrate_media 명령어로 옮깁니다.
+
+    Attributes:
+        store (LocalObjectStore): 파일을 실제로 저장하는 객체 저장소
+    """
+
+    def __init__(self, store=None, store_options=None):
+        store_class = import_string(store) if store else LocalObjectStore
+        self.store = store_class(**(store_options or {}))
+
+    def get_available_name(self, name, max_length=None):
+        # 이름은 _save에서 내용으로 정해지므로 미리 겹치는 이름을 찾지 않습니다.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        sha = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        key = f"{sha[:2]}/{sha[2:4]}/{sha}{ext}"
+        if not self.store.exists(key):
+            content.seek(0)
+            self.store.put(key, content)
+        return key
+
+    def _open(self, name, mode="rb"):
+        return self.store.open(name, mode)
+
+    def delete(self, name):
+        self.store.delete(name)
+
+    def exists(self, name):
+        return self.store.exists(name)
+
+    def size(self, name):
+        return self.store.size(name)
+
+    def url(self, name):
+        return self.store.url(name)
+
+    def path(self, name):
+        if not hasattr(self.store, "path"):
+            raise NotImplementedError("원격 저장소의 파일은 경로가 없습니다.")
+        return self.store.path(name)
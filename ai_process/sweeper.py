@@ -0,0 +1,81 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from ai_process.jobs import job_timeout
+from ai_process.models import Picture, change_pic_in_use, input_pic_in_use
+
+logger = logging.getLogger(__name__)
+
+
+def _orphans(created_before):
+    # 게시글에 붙지 않은 채 TTL이 지난 Picture. TTL이 지나도록 처리되지 않은 대기 작업도 지웁니다.
+    # 워커가 처리중인 작업은 끝난 뒤 다시 저장하므로 건너뛰고, job_timeout이 지나 멈춘 작업만 지웁니다.
+    return Picture.objects.filter(article=None, created_at__lt=created_before).exclude(
+        status=Picture.PROCESSING, claimed_at__gte=timezone.now() - job_timeout()
+    )
+
+
+def _files(pictures):
+    # 지운 Picture들의 파일 경로. 같은 내용의 파일은 함께 쓰므로 남은 Picture나 렌더 캐시가 쓰지 않을 때만 지웁니다.
+    names = []
+    for picture in pictures:
+        if picture.input_pic and not input_pic_in_use(picture.input_pic.name):
+            names.append(picture.input_pic.name)
+        if picture.change_pic and not change_pic_in_use(picture.change_pic.name):
+            names.append(picture.change_pic.name)
+            names.extend((picture.derivatives or {}).values())
+    return list(dict.fromkeys(names))
+
+
+def _delete(name):
+    try:
+        default_storage.delete(name)
+    except OSError:
+        logger.exception("파일 삭제 실패: %s", name)
+        return False
+    return True
+
+
+def sweep(ttl=None, batch_size=None, workers=None):
+    """sweep 게시글에 붙지 않은 Picture 정리
+
+    게시글을 작성하지 않고 남은 Picture 행을 batch_size개씩 지우고, 그 파일들을 최대 workers개 스레드로 나눠 지웁니다.
+    queryset delete는 Picture.delete를 부르지 않으므로 파일은 여기서 직접 지웁니다.
+
+    Args:
+        ttl (timedelta): 만든 지 이 기간이 지난 Picture만 지웁니다. None이면 settings.AI_PROCESS_ORPHAN_TTL_HOURS
+        batch_size (int): 한 번에 지울 Picture 수. None이면 settings.AI_PROCESS_SWEEP_BATCH
+        workers (int): 파일 삭제 스레드 수. None이면 settings.AI_PROCESS_SWEEP_WORKERS
+    Return:
+        (tuple): (지운 Picture 수, 지운 파일 수)
+    """
+    if ttl is None:
+        ttl = timedelta(hours=getattr(settings, "AI_PROCESS_ORPHAN_TTL_HOURS", 24))
+    if batch_size is None:
+        batch_size = getattr(settings, "AI_PROCESS_SWEEP_BATCH", 500)
+    if workers is None:
+        workers = getattr(settings, "AI_PROCESS_SWEEP_WORKERS", 8)
+    created_before = timezone.now() - ttl
+    rows = 0
+    files = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sweep") as pool:
+        while True:
+            ids = list(
+                _orphans(created_before)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # 고른 뒤에 게시글에 붙은 Picture는 다시 걸러 냅니다.
+            batch = _orphans(created_before).filter(id__in=ids)
+            pictures = list(batch)
+            batch.delete()
+            rows += len(pictures)
+            files += sum(pool.map(_delete, _files(pictures)))
+            if len(ids) < batch_size:
+                break
+    return rows, files
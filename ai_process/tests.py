@@ -0,0 +1,598 @@
+import hashlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import forkserver
+from unittest import mock
+import cv2
+import dlib
+import numpy as np
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+from ai_process.cat import (
+    ImageTooLarge,
+    alpha_blend,
+    choose_all,
+    decode,
+    derive,
+    detect_faces,
+    face_boxes,
+    overlaps,
+    picture_generator,
+    plan_placement,
+    preview,
+    read_size,
+    render,
+    scale_faces,
+)
+from ai_process.detectors import get_detector
+from ai_process.pool import RenderPool
+from ai_process.stickers import ResizeCache, StickerPack, premultiply
+from ai_process import timing
+from ai_process.ment import PROMPT_VERSION, ment_key, normalize
+from ai_process.storage import ContentAddressedStorage, is_content_name
+from ai_process.management.commands.bench_blend import float_blend
+from ai_process.management.commands.bench_detectors import matches
+
+"""ai_process 테스트 요약
+
+1. 스티커 합성 결과가 기존 float 합성과 채널당 ±1 이내
+2. 스티커 합성이 원본 이미지 view에 제자리 적용
+3. 크기가 다른 스티커 합성 거부
+4. 축소 탐지 결과를 원본 좌표로 복원
+5. 동시 렌더링 결과가 순차 렌더링과 동일
+6. 렌더링 프로세스 풀 결과가 같은 시드의 직접 렌더링과 동일
+7. 여백이 가장 넓고 사진 안에 들어가는 방향에 스티커 배치
+8. 모든 방향이 사진 밖이면 여백이 가장 넓은 방향을 잘라 배치
+9. 알파가 곱해진 스티커 합성 결과가 기존 합성과 동일
+10. 스티커 묶음 저장 후 불러오기
+11. 크기별 스티커 캐시 적중과 크기 맞추기
+12. 크기별 스티커 캐시 메모리 제한
+13. 저장한 얼굴 박스로 렌더링한 결과가 얼굴 탐지 렌더링과 동일
+14. 겹치면 안 되는 영역을 피해 스티커 배치
+15. 모든 얼굴 모드에서 얼굴마다 겹치지 않는 스티커 합성
+16. Haar cascade 탐지기가 dlib 탐지기의 얼굴을 모두 탐지
+17. 알 수 없는 얼굴 탐지기 거부
+18. 큰 사진을 축소 디코딩해 최대 변 길이에 맞춤
+19. 픽셀 수 제한을 넘는 사진은 디코딩 전에 거부
+20. 변환사진보다 작은 너비별 변환사진 생성
+21. 미리보기에서 고른 얼굴, 스티커로 전체 해상도 변환사진 생성
+22. 단계별 처리 시간 측정과 히스토그램
+23. 단계별 최대 메모리 측정
+24. 같은 내용의 파일을 내용 주소 경로에 한 번만 저장
+25. 공백, 대소문자만 다른 설명은 같은 멘트 캐시 키
+26. 워커 기동 시 미리 만든 렌더링 프로세스 풀로 렌더링
+27. 렌더링 시간 초과 시 렌더링 프로세스 교체
+"""
+
+
+class AlphaBlendTestCase(SimpleTestCase):
+    """스티커 합성 테스트
+
+    alpha_blend를 기존 float64 합성과 비교합니다.
+    """
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.img = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        self.sticker = rng.integers(0, 256, (50, 70, 4), dtype=np.uint8)
+        self.sticker[:10, :, 3] = 0
+        self.sticker[10:20, :, 3] = 255
+
+    def test_alpha_blend_matches_float(self):
+        """기존 합성과 비교
+
+        채널당 차이가 1 이하인지 테스트합니다.
+        """
+        expected = float_blend(self.img[10:60, 20:90].copy(), self.sticker)
+        result = alpha_blend(self.img[10:60, 20:90].copy(), self.sticker)
+        diff = np.abs(expected.astype(np.int16) - result)
+        self.assertLessEqual(diff.max(), 1)
+
+    def test_alpha_blend_in_place(self):
+        """제자리 합성
+
+        원본 이미지의 view에 합성되고 영역 밖은 변하지 않는지 테스트합니다.
+        """
+        img = self.img.copy()
+        alpha_blend(img[10:60, 20:90], self.sticker)
+        self.assertTrue(np.array_equal(img[:10], self.img[:10]))
+        self.assertTrue(np.array_equal(img[10:20, 20:90], self.img[10:20, 20:90]))
+        self.assertTrue(np.array_equal(img[20:30, 20:90], self.sticker[10:20, :, :3]))
+
+    def test_alpha_blend_premultiplied(self):
+        """알파가 곱해진 스티커 합성
+
+        미리 알파를 곱해 둔 스티커의 합성 결과가 일반 합성과 같은지 테스트합니다.
+        """
+        expected = alpha_blend(self.img[10:60, 20:90].copy(), self.sticker)
+        result = alpha_blend(
+            self.img[10:60, 20:90].copy(), premultiply(self.sticker), premultiplied=True
+        )
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_alpha_blend_shape_mismatch(self):
+        """크기 불일치
+
+        스티커와 영역의 크기가 다르면 ValueError가 발생하는지 테스트합니다.
+        """
+        with self.assertRaises(ValueError):
+            alpha_blend(self.img[10:59, 20:90], self.sticker)
+
+
+class DetectFacesTestCase(SimpleTestCase):
+    """얼굴 탐지 테스트
+
+    축소 사본에서 탐지한 얼굴 박스가 원본 해상도 좌표로 돌아오는지 테스트합니다.
+    """
+
+    def test_detect_faces_downscaled(self):
+        """축소 탐지 좌표 복원
+
+        2배 확대한 사진을 축소 탐지했을 때, 원본 탐지 박스의 2배 위치 근처에 얼굴이 있는지 테스트합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        big = cv2.resize(img, dsize=None, fx=2, fy=2)
+        expected = sorted((d.left() * 2, d.top() * 2) for d in detect_faces(img, 0))
+        result = sorted((d.left(), d.top()) for d in detect_faces(big, 640))
+        self.assertEqual(len(result), len(expected))
+        for (ex, ey), (x, y) in zip(expected, result):
+            self.assertAlmostEqual(x, ex, delta=20)
+            self.assertAlmostEqual(y, ey, delta=20)
+
+    def test_detect_faces_haar(self):
+        """Haar cascade 탐지기
+
+        OpenCV Haar cascade 탐지기가 dlib 탐지기가 찾은 얼굴을 모두 찾는지 테스트합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        expected = face_boxes(detect_faces(img, detector="dlib"))
+        result = face_boxes(detect_faces(img, detector="haar"))
+        self.assertEqual(matches(result, expected), len(expected))
+
+    def test_unknown_detector(self):
+        """알 수 없는 얼굴 탐지기
+
+        등록되지 않은 탐지기 이름이면 ValueError가 발생하는지 테스트합니다.
+        """
+        with self.assertRaises(ValueError):
+            get_detector("unknown")
+
+
+class DecodeTestCase(SimpleTestCase):
+    """디코딩 테스트
+
+    헤더로 크기를 확인하고 큰 사진을 축소 디코딩하는지 테스트합니다.
+    """
+
+    def setUp(self) -> None:
+        img = cv2.imread("static/test_image.jpg")
+        self.big = cv2.imencode(".jpg", cv2.resize(img, dsize=(2560, 1436)))[1]
+        self.big = self.big.tobytes()
+
+    def test_decode_reduced(self):
+        """축소 디코딩
+
+        긴 변이 max_side보다 큰 사진은 max_side에 맞춰 디코딩되는지 테스트합니다.
+        """
+        self.assertEqual(read_size(self.big), (2560, 1436))
+        img = decode(self.big, 640)
+        self.assertEqual(img.shape, (359, 640, 3))
+        self.assertEqual(decode(self.big, 0).shape, (1436, 2560, 3))
+
+    @override_settings(AI_PROCESS_MAX_PIXELS=2560 * 1436 - 1)
+    def test_decode_too_large(self):
+        """픽셀 수 제한
+
+        픽셀 수 제한을 넘으면 ImageTooLarge가 발생하는지 테스트합니다.
+        """
+        with self.assertRaises(ImageTooLarge):
+            read_size(self.big)
+        with self.assertRaises(ImageTooLarge):
+            decode(self.big)
+
+    @override_settings(AI_PROCESS_PREVIEW_SIDE=640)
+    def test_preview_then_full(self):
+        """미리보기 후 전체 해상도 변환
+
+        줄인 사진으로 만든 미리보기의 얼굴 박스와 placements로 얼굴 탐지 없이 같은 얼굴, 스티커의 변환사진이 만들어지는지 테스트합니다.
+        전체 해상도에서는 얼굴과 스티커를 rng로 다시 고르지 않는지 여러 시드와 두 얼굴 모드로 확인합니다.
+        """
+        for all_faces in (False, True):
+            for seed in range(8):
+                info = {}
+                small = preview(
+                    self.big, random.Random(seed), info=info, all_faces=all_faces
+                )
+                small = cv2.imdecode(np.frombuffer(small, np.uint8), 1)
+                self.assertEqual(small.shape, (359, 640, 3))
+                self.assertTrue(info["faces"])
+                self.assertTrue(info["placements"])
+                full = {}
+                with mock.patch.multiple(
+                    "ai_process.cat",
+                    detect_faces=mock.DEFAULT,
+                    choose=mock.DEFAULT,
+                    choose_all=mock.DEFAULT,
+                ) as patched:
+                    picture_generator(
+                        self.big,
+                        rng=random.Random(seed),
+                        faces=info["faces"],
+                        size=(info["width"], info["height"]),
+                        info=full,
+                        all_faces=all_faces,
+                        placements=info["placements"],
+                    )
+                for name in ("detect_faces", "choose", "choose_all"):
+                    patched[name].assert_not_called()
+                self.assertEqual((full["width"], full["height"]), (2048, 1149))
+                self.assertEqual(
+                    full["faces"], scale_faces(info["faces"], (640, 359), (2048, 1149))
+                )
+                for key in ("face", "sticker", "placements"):
+                    self.assertEqual(full[key], info[key], (all_faces, seed))
+
+    def test_derive(self):
+        """너비별 변환사진
+
+        변환사진보다 작은 너비만 비율을 유지해 만들어지는지 테스트합니다.
+        """
+        img = decode(self.big)
+        derivatives = derive(img, (320, 640, 4096), "jpeg")
+        self.assertEqual(sorted(derivatives), [320, 640])
+        small = cv2.imdecode(np.frombuffer(derivatives[320], np.uint8), 1)
+        self.assertEqual(small.shape, (180, 320, 3))
+
+
+class StickerPackTestCase(SimpleTestCase):
+    """스티커 묶음 테스트
+
+    스티커 PNG 폴더로 만든 묶음을 테스트합니다.
+    """
+
+    def test_sticker_pack_save_load(self):
+        """스티커 묶음 저장 후 불러오기
+
+        네 방향의 스티커가 모두 묶이고, 저장 후 memory-map으로 불러온 스티커가 원래와 같은지 테스트합니다.
+        """
+        pack = StickerPack.from_dir("static/imgs")
+        self.assertEqual(set(pack.directions), {"top", "left", "right", "under"})
+        with tempfile.TemporaryDirectory() as pack_dir:
+            pack.save(pack_dir)
+            loaded = StickerPack.load(pack_dir)
+            self.assertEqual(loaded.manifest, pack.manifest)
+            for entry in pack.manifest:
+                self.assertTrue(np.array_equal(loaded.image(entry), pack.image(entry)))
+            entry = pack.directions["left"][0]
+            png = cv2.imread(f'static/imgs/{entry["id"]}.png', cv2.IMREAD_UNCHANGED)
+            self.assertTrue(np.array_equal(loaded.image(entry), premultiply(png)))
+            del loaded
+
+
+class ResizeCacheTestCase(SimpleTestCase):
+    """크기별 스티커 캐시 테스트
+
+    ResizeCache의 적중/실패 수와 메모리 제한을 테스트합니다.
+    """
+
+    def setUp(self) -> None:
+        self.pack = StickerPack.from_dir("static/imgs")
+        self.entry = self.pack.directions["left"][0]
+
+    def test_resize_cache_bucket(self):
+        """크기별 캐시 적중
+
+        같은 bucket 안의 크기는 resize 없이 캐시에서 가져오고, 요청한 크기로 맞춰지는지 테스트합니다.
+        """
+        cache = ResizeCache(bucket=8)
+        first = cache.get(self.pack, self.entry, 101, 77)
+        second = cache.get(self.pack, self.entry, 103, 79)
+        self.assertEqual(first.shape, (77, 101, 4))
+        self.assertEqual(second.shape, (79, 103, 4))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_resize_cache_max_bytes(self):
+        """메모리 제한
+
+        보관한 스티커의 총 크기가 max_bytes를 넘으면 오래된 것부터 지우는지 테스트합니다.
+        """
+        cache = ResizeCache(max_bytes=100 * 100 * 4 * 2, bucket=0)
+        for size in (100, 99, 98):
+            cache.get(self.pack, self.entry, size, size)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+        cache.get(self.pack, self.entry, 100, 100)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+
+class PlanPlacementTestCase(SimpleTestCase):
+    """스티커 위치 결정 테스트
+
+    plan_placement가 사진 경계 안의 영역을 고르는지 테스트합니다.
+    """
+
+    def test_plan_placement_largest_margin(self):
+        """여백이 가장 넓은 방향
+
+        사진 가운데 위쪽 얼굴은 아래쪽 여백에 배치되는지 테스트합니다.
+        """
+        det = dlib.rectangle(180, 40, 220, 80)
+        direction, region = plan_placement(det, 400, 300)
+        self.assertEqual(direction, "under")
+        self.assertEqual(region, (168, 80, 232, 180))
+
+    def test_plan_placement_skip_out_of_bounds(self):
+        """사진 밖 영역 건너뛰기
+
+        여백이 가장 넓은 방향의 영역이 사진 밖으로 나가면 다음 방향을 고르는지 테스트합니다.
+        """
+        det = dlib.rectangle(100, 0, 160, 60)
+        direction, region = plan_placement(det, 400, 300)
+        self.assertEqual(direction, "under")
+        left, top, right, bottom = region
+        self.assertTrue(0 <= left < right <= 400 and 0 <= top < bottom <= 300)
+
+    def test_plan_placement_clip(self):
+        """사진 경계에 맞춰 자르기
+
+        모든 방향이 사진 밖으로 나가면 여백이 가장 넓은 방향의 영역을 잘라 쓰는지 테스트합니다.
+        """
+        det = dlib.rectangle(10, 0, 60, 50)
+        direction, region = plan_placement(det, 400, 300)
+        self.assertEqual(direction, "right")
+        self.assertEqual(region, (60, 0, 217, 60))
+
+    def test_plan_placement_occupied(self):
+        """겹치면 안 되는 영역 피하기
+
+        여백이 가장 넓은 방향이 다른 영역과 겹치면 다음 방향을 고르는지 테스트합니다.
+        """
+        det = dlib.rectangle(180, 40, 220, 80)
+        direction, region = plan_placement(det, 400, 300, [(150, 150, 250, 250)])
+        self.assertNotEqual(direction, "under")
+        self.assertFalse(overlaps(region, [(150, 150, 250, 250)]))
+
+
+class RenderTestCase(SimpleTestCase):
+    """렌더링 테스트
+
+    스티커 렌더링을 테스트합니다.
+    """
+
+    def test_render_concurrent(self):
+        """동시 렌더링
+
+        여러 스레드에서 동시에 렌더링한 결과가 같은 시드의 순차 렌더링 결과와 같은지 테스트합니다.
+        크기가 다른 사진을 섞어 서로의 스티커 위치 계산을 오염시키지 않는지 확인합니다.
+        """
+        base = cv2.imread("static/test_image.jpg")
+        images = [
+            cv2.resize(base, dsize=None, fx=scale, fy=scale)
+            for scale in (1, 1.25, 1.5, 2)
+        ]
+
+        def job(seed):
+            img = images[seed % len(images)].copy()
+            return render(img, random.Random(seed))
+
+        seeds = range(32)
+        expected = [job(seed) for seed in seeds]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(job, seeds))
+        for seed in seeds:
+            self.assertTrue(np.array_equal(results[seed], expected[seed]), seed)
+
+    def test_render_saved_faces(self):
+        """저장한 얼굴 박스로 렌더링
+
+        render가 채운 얼굴 박스를 넘겨 다시 렌더링하면 탐지 없이 같은 결과가 나오는지 테스트합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        info = {}
+        expected = render(img.copy(), random.Random(0), info=info)
+        self.assertEqual((info["height"], info["width"]), img.shape[:2])
+        self.assertEqual(info["faces"], face_boxes(detect_faces(img)))
+        self.assertIsNotNone(info["face"])
+        self.assertTrue(info["sticker"])
+        result = render(img.copy(), random.Random(0), faces=info["faces"])
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_render_all_faces(self):
+        """모든 얼굴 모드
+
+        얼굴마다 다른 얼굴이나 스티커와 겹치지 않는 영역에 스티커가 하나씩 합성되는지 테스트합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        faces = face_boxes(detect_faces(img))
+        self.assertGreaterEqual(len(faces), 2)
+        h, w = img.shape[:2]
+        choices = choose_all(faces, w, h, random.Random(0))
+        self.assertEqual(len(choices), len(faces))
+        regions = [region for _, _, region in choices]
+        for i, region in enumerate(regions):
+            self.assertFalse(overlaps(region, regions[:i] + regions[i + 1 :]))
+            others = [face for j, face in enumerate(faces) if j != choices[i][0]]
+            self.assertFalse(overlaps(region, others))
+        info = {}
+        result = render(img.copy(), random.Random(0), info=info, all_faces=True)
+        self.assertIsNone(info["face"])
+        self.assertEqual(len(info["sticker"].split(",")), len(faces))
+        for left, top, right, bottom in regions:
+            self.assertFalse(
+                np.array_equal(
+                    result[top:bottom, left:right], img[top:bottom, left:right]
+                )
+            )
+
+    def test_render_pool(self):
+        """렌더링 프로세스 풀
+
+        공유 메모리로 넘긴 렌더링 결과가 같은 시드로 직접 렌더링한 결과와 같은지 테스트합니다.
+        작업 1개마다 렌더링 프로세스를 교체해 재시작 후에도 동작하는지 확인합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        pool = RenderPool(1, max_jobs=1, timeout=60)
+        try:
+            for seed in range(2):
+                expected = render(img.copy(), random.Random(seed))
+                result = pool.render(img.copy(), random.Random(seed))
+                self.assertTrue(np.array_equal(result, expected))
+            # 저장해 둔 얼굴과 스티커도 렌더링 프로세스에 넘어가는지 확인합니다.
+            info = {}
+            render(img.copy(), random.Random(0), info=info)
+            saved = {"faces": info["faces"], "placements": info["placements"]}
+            expected = render(img.copy(), random.Random(1), **saved)
+            result = pool.render(img.copy(), random.Random(1), **saved)
+            self.assertTrue(np.array_equal(result, expected))
+        finally:
+            pool.close()
+
+    def test_render_pool_timeout(self):
+        """렌더링 시간 초과 시 렌더링 프로세스 교체
+
+        시간이 초과된 작업을 처리하던 렌더링 프로세스는 종료되고, 새 렌더링 프로세스로 계속 렌더링하는지 테스트합니다.
+        """
+        img = cv2.imread("static/test_image.jpg")
+        big = cv2.resize(img, dsize=None, fx=6, fy=6)
+        pool = RenderPool(1, max_jobs=100, timeout=60)
+        try:
+            pool.render(img.copy(), random.Random(0))
+            pid = pool._pool._pool[0].pid
+            pool.timeout = 0.03
+            with self.assertRaises(TimeoutError):
+                pool.render(big.copy(), random.Random(0))
+            for _ in range(100):
+                if not pool._pool._pool[0].is_alive() or pool._pool._pool[0].pid != pid:
+                    break
+                time.sleep(0.1)
+            self.assertNotIn(pid, [p.pid for p in pool._pool._pool if p.is_alive()])
+            pool.timeout = 60
+            expected = render(img.copy(), random.Random(1))
+            result = pool.render(img.copy(), random.Random(1))
+            self.assertTrue(np.array_equal(result, expected))
+        finally:
+            pool.close()
+
+    def test_render_pool_warmup(self):
+        """워커 기동 시 미리 생성한 렌더링 프로세스 풀
+
+        AI_PROCESS_WARMUP과 AI_PROCESS_POOL_SIZE가 켜진 설정으로 렌더링 프로세스가 django.setup을 실행해도
+        렌더링 프로세스 안에서 다시 풀을 만들지 않고 렌더링하는지 테스트합니다.
+        """
+        env = {"AI_PROCESS_WARMUP": "1", "AI_PROCESS_POOL_SIZE": "1"}
+        # 렌더링 프로세스가 이 환경변수를 받도록 forkserver를 새로 띄웁니다.
+        forkserver._forkserver._stop()
+        self.addCleanup(forkserver._forkserver._stop)
+        img = cv2.imread("static/test_image.jpg")
+        with mock.patch.dict(os.environ, env):
+            pool = RenderPool(1, max_jobs=1, timeout=60)
+        try:
+            expected = render(img.copy(), random.Random(0))
+            result = pool.render(img.copy(), random.Random(0))
+            self.assertTrue(np.array_equal(result, expected))
+        finally:
+            pool.close()
+
+
+class TimingTestCase(SimpleTestCase):
+    """단계별 측정 테스트
+
+    변환 파이프라인의 단계별 시간, 메모리 측정을 테스트합니다.
+    """
+
+    def setUp(self) -> None:
+        timing.reset()
+
+    def test_record_stages(self):
+        """단계별 처리 시간
+
+        측정중인 스레드의 단계만 기록되어 Server-Timing 헤더와 히스토그램에 모이는지 테스트합니다.
+        """
+        with timing.Stage("decode"):
+            pass
+        with timing.record(memory=False) as timings:
+            for _ in range(2):
+                with timing.Stage("blend"):
+                    pass
+            with timing.Stage("encode"):
+                pass
+        self.assertEqual(list(timings.durations), ["blend", "encode"])
+        self.assertRegex(
+            timings.header(),
+            r"^blend;dur=\d+\.\d, encode;dur=\d+\.\d, total;dur=\d+\.\d$",
+        )
+        histograms = timing.histograms()
+        self.assertEqual(set(histograms), {"blend", "encode", "total"})
+        self.assertEqual(histograms["blend"]["count"], 1)
+        self.assertEqual(histograms["blend"]["buckets"]["1"], 1)
+
+    def test_record_memory(self):
+        """단계별 최대 메모리
+
+        메모리 측정 모드에서 단계 중 잠깐 할당한 numpy 배열 크기가 최대 메모리로 기록되는지 테스트합니다.
+        """
+        # record가 켠 tracemalloc이 다른 테스트를 느리게 하지 않도록 끕니다.
+        self.addCleanup(tracemalloc.stop)
+        with timing.record(memory=True) as timings:
+            with timing.Stage("decode"):
+                np.ones(8 * 2**20, dtype=np.uint8)
+        self.assertGreaterEqual(timings.peaks["decode"], 8 * 2**20)
+        self.assertIn("decode;dur=", timings.header())
+        self.assertIn('desc="peak 8.', timings.header())
+
+
+class StorageTestCase(SimpleTestCase):
+    """내용 주소 storage 테스트
+
+    로컬 파일시스템 객체 저장소로 ContentAddressedStorage를 테스트합니다.
+    """
+
+    def test_content_addressed(self):
+        """내용 주소 경로와 중복 제거
+
+        같은 내용은 이름과 상관없이 "ab/cd/<sha256>.ext" 한 파일에 저장되고, 이전 경로도 열 수 있는지 테스트합니다.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = ContentAddressedStorage(
+                store="ai_process.storage.LocalObjectStore",
+                store_options={"location": tmp, "base_url": "/m/"},
+            )
+            name = storage.save("2023/06/input/a.JPG", ContentFile(b"cat"))
+            sha = hashlib.sha256(b"cat").hexdigest()
+            self.assertEqual(name, f"{sha[:2]}/{sha[2:4]}/{sha}.jpg")
+            self.assertTrue(is_content_name(name))
+            self.assertEqual(storage.save("b.jpg", ContentFile(b"cat")), name)
+            self.assertNotEqual(storage.save("c.jpg", ContentFile(b"dog")), name)
+            self.assertEqual(storage.url(name), "/m/" + name)
+            with storage.open(name) as f:
+                self.assertEqual(f.read(), b"cat")
+            storage.delete(name)
+            self.assertFalse(storage.exists(name))
+            storage.store.put("2023/06/input/old.jpg", ContentFile(b"old"))
+            self.assertFalse(is_content_name("2023/06/input/old.jpg"))
+            self.assertEqual(storage.size("2023/06/input/old.jpg"), 3)
+
+
+class MentKeyTestCase(SimpleTestCase):
+    """멘트 캐시 키 테스트
+
+    설명 정규화와 캐시 키를 테스트합니다.
+    """
+
+    def test_ment_key(self):
+        """같은 멘트 캐시 키
+
+        공백, 대소문자, 전각 문자만 다른 설명은 같은 키이고, 프롬프트 버전이 바뀌면 키도 바뀌는지 테스트합니다.
+        """
+        self.assertEqual(normalize("  Cat\t sleeps\n"), "cat sleeps")
+        self.assertEqual(normalize("ＣＡＴ"), "cat")
+        key = ment_key("cat sleeps")
+        self.assertEqual(ment_key("Cat  sleeps"), key)
+        self.assertNotEqual(ment_key("cat eats"), key)
+        with mock.patch("ai_process.ment.PROMPT_VERSION", PROMPT_VERSION + 1):
+            self.assertNotEqual(ment_key("cat sleeps"), key)
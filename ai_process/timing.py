@@ -0,0 +1,176 @@
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from django.conf import settings
+
+# 변환 파이프라인의 단계별 처리 시간을 잽니다.
+# record()로 측정을 시작한 스레드에서만 기록하고, 측정중이 아니면 Stage는 스레드 로컬을 한 번 읽고 끝납니다.
+# 측정 결과는 요청별 Server-Timing 헤더로 내보내고, 프로세스 안의 단계별 히스토그램에 모읍니다.
+_local = threading.local()
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+# 히스토그램 구간의 상한(ms). 마지막 구간("+Inf")은 가장 큰 상한보다 긴 시간입니다.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Timings:
+    """Timings 요청 하나의 단계별 측정 결과
+
+    Attributes:
+        durations (dict): {단계 이름: 시간(ms)}. 같은 단계를 여러 번 실행하면(얼굴마다 blend) 더합니다.
+        peaks (dict): {단계 이름: 단계 중 늘어난 최대 메모리(바이트)}. 메모리 측정 모드에서만 채웁니다.
+        memory (bool): 메모리 측정 모드 여부
+        total (float): record() 전체 시간(ms). 측정이 끝난 뒤에 채웁니다.
+    """
+
+    def __init__(self, memory=False):
+        self.durations = {}
+        self.peaks = {}
+        self.memory = memory
+        self.total = None
+
+    def add(self, name, ms, peak=None):
+        """Timings.add 단계 측정값 더하기
+
+        Args:
+            name (str): 단계 이름
+            ms (float): 걸린 시간(ms)
+            peak (int): 단계 중 늘어난 최대 메모리(바이트). 메모리 측정 모드가 아니면 None
+        """
+        self.durations[name] = self.durations.get(name, 0.0) + ms
+        if peak is not None:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def header(self):
+        """Timings.header Server-Timing 헤더 값 만들기
+
+        Return:
+            (str): 'decode;dur=12.3, detect;dur=40.1, ..., total;dur=80.2' 형식의 값.
+                메모리 측정 모드에서는 desc에 단계별 최대 메모리를 적습니다.
+        """
+        parts = []
+        for name, ms in self.durations.items():
+            part = f"{name};dur={ms:.1f}"
+            if name in self.peaks:
+                part += f';desc="peak {self.peaks[name] / 2**20:.1f}MiB"'
+            parts.append(part)
+        if self.total is not None:
+            parts.append(f"total;dur={self.total:.1f}")
+        return ", ".join(parts)
+
+
+class Stage:
+    """Stage 단계 시간 측정 context manager
+
+    with Stage("decode"): 처럼 사용합니다. 같은 스레드에서 record()로 측정중일 때만 기록합니다.
+    메모리 측정 모드의 최대 메모리는 tracemalloc으로 재므로 numpy 배열을 포함한 Python 할당만 셉니다.
+    단계를 중첩하면 안쪽 단계가 최대 메모리 기록을 초기화하므로 단계는 중첩하지 않습니다.
+
+    Attributes:
+        name (str): 단계 이름 (Server-Timing 항목 이름)
+    """
+
+    __slots__ = ("name", "timings", "start", "base")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = getattr(_local, "timings", None)
+        if self.timings is not None:
+            if self.timings.memory:
+                self.base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = self.timings
+        if timings is not None:
+            ms = (time.perf_counter() - self.start) * 1000
+            peak = None
+            if timings.memory:
+                peak = max(0, tracemalloc.get_traced_memory()[1] - self.base)
+            timings.add(self.name, ms, peak)
+        return False
+
+
+@contextmanager
+def record(memory=None):
+    """record 단계별 측정 시작
+
+    with 블록 안에서 같은 스레드가 실행한 Stage를 모으고, 블록이 끝나면 히스토그램에 더합니다.
+
+    Args:
+        memory (bool): 단계별 최대 메모리도 잴지 여부. None이면 settings.AI_PROCESS_TIMING_MEMORY를 사용합니다.
+            처음 켜질 때 tracemalloc을 시작하며 이후 모든 할당이 느려지므로 프로파일링할 때만 켭니다.
+            여러 요청이 동시에 실행되면 다른 스레드의 할당도 섞입니다.
+    Return:
+        (Timings): 측정 결과. with 블록이 끝나면 total이 채워집니다.
+    """
+    if memory is None:
+        memory = getattr(settings, "AI_PROCESS_TIMING_MEMORY", False)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    timings = Timings(memory)
+    previous = getattr(_local, "timings", None)
+    _local.timings = timings
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.total = (time.perf_counter() - start) * 1000
+        _local.timings = previous
+        observe(timings)
+
+
+def observe(timings):
+    """observe 측정 결과를 히스토그램에 더하기
+
+    Args:
+        timings (Timings): 끝난 측정 결과
+    """
+    samples = dict(timings.durations)
+    if timings.total is not None:
+        samples["total"] = timings.total
+    with _histograms_lock:
+        for name, ms in samples.items():
+            histogram = _histograms.get(name)
+            if histogram is None:
+                histogram = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(BUCKETS) + 1),
+                }
+                _histograms[name] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += ms
+            histogram["buckets"][bisect_left(BUCKETS, ms)] += 1
+
+
+def histograms():
+    """histograms 이 프로세스의 단계별 히스토그램
+
+    Return:
+        (dict): {단계 이름: {"count", "sum"(ms), "mean"(ms), "buckets": {상한(ms) 또는 "+Inf": 개수}}}
+    """
+    labels = [str(bound) for bound in BUCKETS] + ["+Inf"]
+    with _histograms_lock:
+        return {
+            name: {
+                "count": histogram["count"],
+                "sum": histogram["sum"],
+                "mean": histogram["sum"] / histogram["count"],
+                "buckets": dict(zip(labels, histogram["buckets"])),
+            }
+            for name, histogram in _histograms.items()
+        }
+
+
+def reset():
+    """reset 히스토그램 비우기"""
+    with _histograms_lock:
+        _histograms.clear()
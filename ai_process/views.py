@@ -1,11 +1,30 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import APIView
 from rest_framework.response import Response
+from rest_framework.generics import get_object_or_404
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect
+import base64
+import json
+import logging
 import openai
 import os
 from ai_process.serializers import PictureSerializer
-from ai_process.cat import picture_generator
-from .models import Picture
+from ai_process.cat import ImageTooLarge, read_size
+from ai_process.timing import Stage, record
+from ai_process.media import serve_file
+from ai_process.ment import cat_says, stream_cat_says
+from ai_process.jobs import (
+    enqueue,
+    materialize,
+    preview_picture,
+    render_picture,
+    reroll,
+)
+from .models import MediaAlias, Picture
+
+logger = logging.getLogger(__name__)
 
 
 class MentgenView(APIView):
@@ -23,23 +42,73 @@ class MentgenView(APIView):
         """Mentgen.post
 
         post요청 시 입력받은 description으로 cat_says를 생성하여 반환합니다.
+        정규화한 description이 같으면 캐시된 멘트를 반환하고, fresh가 "1"이나 "true"면 새로 만듭니다.
 
         정상 시 200 / "unlike했습니다." || "like했습니다." 메시지 반환
         오류 시 401 / 권한없음(비로그인)
         오류 시 404 / 존재하지않는 게시글
         """
-        result = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "입력값에 주어진 상황(참고로 이것은 사진의 내용과 연관이 있다옹!)을 지켜보던 고양이가 있다고 가정한다옹. 문장의 화자와 너(고양이)는 다른 객체임을 명확히 인지하라냥! 그 고양이가 화난 이유를 한문장으로 만들어라냥. 웃기고 고양이다운 이유여야한다옹! 부적절한 문장이거나 이해할 수 없다면, 고양이답게 화내고 공격하겠다고 협박해라냥!!",
-                },
-                {"role": "user", "content": request.data.get("description", "")},
-            ],
+        message, cached = cat_says(
+            request.data.get("description", ""),
+            fresh=str(request.data.get("fresh", "")).lower() in ("1", "true"),
+        )
+        return Response(
+            {"message": message, "cached": cached}, status=status.HTTP_200_OK
         )
-        message = result.choices[0].message.content
-        return Response({"message": message}, status=status.HTTP_200_OK)
+
+
+def _sse(event, data):
+    # Server-Sent Events 한 건. data는 한 줄의 JSON으로 보내므로 멘트의 줄바꿈이 이벤트를 나누지 않습니다.
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _ment_events(description, fresh):
+    try:
+        for event, value in stream_cat_says(description, fresh=fresh):
+            if event == "token":
+                yield _sse("token", {"text": value})
+            else:
+                message, cached = value
+                yield _sse("done", {"message": message, "cached": cached})
+    except openai.error.OpenAIError:
+        # 응답 헤더는 이미 보냈으므로 오류도 이벤트로 알립니다.
+        logger.exception("멘트 생성 실패")
+        yield _sse("error", {"detail": "멘트를 만들지 못했습니다."})
+
+
+class MentgenStreamView(APIView):
+    """MentgenStreamView
+
+    chat gpt로 고양이 멘트를 생성하며, 받은 토큰을 Server-Sent Events로 바로 보냅니다.
+    WSGI 서버에서 동기 generator로 보내므로 전체 응답을 기다리지 않고 첫 토큰부터 화면에 보일 수 있습니다.
+
+    Attributes:
+        permission (permissions): IsAuthenticated 로그인한 사용자만 접속을 허용합니다.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """MentgenStream.post
+
+        post요청 시 입력받은 description으로 cat_says를 생성하며 text/event-stream으로 보냅니다.
+        캐시와 fresh는 Mentgen.post와 같습니다.
+
+        정상 시 200 / "token" 이벤트 {"text": 토큰}을 여러 번 보낸 뒤 "done" 이벤트 {"message": 멘트, "cached": 캐시 여부}
+        오류 시 200 / 생성 중 chat gpt 오류는 "error" 이벤트 {"detail": 메시지}
+        오류 시 401 / 권한없음(비로그인)
+        """
+        response = StreamingHttpResponse(
+            _ment_events(
+                request.data.get("description", ""),
+                str(request.data.get("fresh", "")).lower() in ("1", "true"),
+            ),
+            content_type="text/event-stream; charset=utf-8",
+        )
+        response["Cache-Control"] = "no-cache"
+        # nginx가 응답을 모아 보내지 않게 합니다.
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 
 class PicgenView(APIView):
@@ -47,6 +116,7 @@ class PicgenView(APIView):
 
     post 요청시 입력된 사진으로 변환된 사진을 생성하여 반환합니다.
     매 요청마다 두 사진을 Picture모델에 저장합니다.
+    settings.AI_PROCESS_PICGEN_ASYNC가 켜져 있으면 변환은 작업 큐에서 처리되고, 작업 id를 바로 반환합니다.
 
     Attributes:
         permission (permissions): IsAuthenticated 로그인한 사용자만 접속을 허용합니다.
@@ -58,15 +128,213 @@ class PicgenView(APIView):
         """PicgenView.post
 
         post요청 시 입력받은 사진으로 변환된 사진을 생성하여 반환합니다.
+        mode를 ALL로 보내면 모든 얼굴에 겹치지 않게 스티커를 붙입니다. (기본값 ONE: 얼굴 하나)
+
+        정상 시 201 / 변환이 끝난 Picture 반환 (동기 모드). Server-Timing 헤더에 단계별 처리 시간(ms)을 담습니다.
+        정상 시 202 / 대기(PENDING) 상태의 Picture 반환, id로 진행 상태 조회 (비동기 모드)
+        오류 시 400 / 올바르지 않은 입력, 변환할 수 없는 사진
+        오류 시 413 / 픽셀 수 제한(settings.AI_PROCESS_MAX_PIXELS)을 넘는 사진
+        오류 시 503 / 렌더링 프로세스 풀의 응답 시간 초과
         """
-        Picture.objects.filter(article=None, author=request.user).delete()
         serializer = PictureSerializer(data=request.data)
         if serializer.is_valid():
-            orm = serializer.save(author=request.user)
-            change_pic = picture_generator("media/" + orm.__dict__["input_pic"])
-            orm.change_pic = change_pic.replace("media/", "")
-            orm.save()
+            # 업로드된 파일을 메모리에서 바로 변환하므로 저장한 입력사진을 다시 읽지 않습니다.
+            upload = serializer.validated_data["input_pic"]
+            upload.seek(0)
+            data = upload.read()
+            upload.seek(0)
+            # 디코딩하기 전에 헤더로 크기를 확인해 너무 큰 사진은 저장하지 않고 거부합니다.
+            try:
+                read_size(data)
+            except ImageTooLarge:
+                return Response(
+                    {"input_pic": ["이미지가 너무 큽니다."]},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                )
+            if getattr(settings, "AI_PROCESS_PICGEN_ASYNC", False):
+                # 작업 조회에서 변환사진 없는 완료 상태가 보이지 않도록 처음부터 대기 상태로 저장합니다.
+                orm = serializer.save(author=request.user, status=Picture.PENDING)
+                enqueue(orm)
+                new_serializer = PictureSerializer(instance=orm)
+                return Response(new_serializer.data, status=status.HTTP_202_ACCEPTED)
+            with record() as timings:
+                with Stage("storage"):
+                    orm = serializer.save(author=request.user)
+                try:
+                    render_picture(orm, data)
+                except TimeoutError:
+                    # 변환사진이 없는 Picture가 완료 상태로 남지 않도록 지웁니다.
+                    orm.delete()
+                    return Response(
+                        {"message": "이미지 생성 시간이 초과되었습니다."},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    )
+                except ValueError:
+                    orm.delete()
+                    return Response(
+                        {"input_pic": ["이미지를 읽을 수 없습니다."]},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
             new_serializer = PictureSerializer(instance=orm)
-            return Response(new_serializer.data, status=status.HTTP_201_CREATED)
+            return Response(
+                new_serializer.data,
+                status=status.HTTP_201_CREATED,
+                headers={"Server-Timing": timings.header()},
+            )
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PicgenPreviewView(APIView):
+    """PicgenPreviewView
+
+    post 요청시 입력된 사진을 줄여 변환한 미리보기를 바로 반환합니다.
+    전체 해상도 변환사진은 미리보기의 Picture id로 게시글을 작성할 때 만들어집니다.
+
+    Attributes:
+        permission (permissions): IsAuthenticated 로그인한 사용자만 접속을 허용합니다.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """PicgenPreviewView.post
+
+        post요청 시 입력받은 사진으로 미리보기를 만들어 Picture와 함께 반환합니다.
+        preview에는 미리보기 JPEG이 data URI로 담기고, change_pic은 게시글을 작성한 뒤에 만들어집니다.
+        mode는 picgen/ 과 같습니다.
+
+        정상 시 201 / 미리보기(PREVIEW) 상태의 Picture와 preview 반환
+        오류 시 400 / 올바르지 않은 입력, 변환할 수 없는 사진
+        오류 시 401 / 권한없음(비로그인)
+        오류 시 413 / 픽셀 수 제한(settings.AI_PROCESS_MAX_PIXELS)을 넘는 사진
+        """
+        serializer = PictureSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        upload = serializer.validated_data["input_pic"]
+        upload.seek(0)
+        data = upload.read()
+        upload.seek(0)
+        try:
+            read_size(data)
+        except ImageTooLarge:
+            return Response(
+                {"input_pic": ["이미지가 너무 큽니다."]},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        orm = serializer.save(author=request.user)
+        try:
+            content = preview_picture(orm, data)
+        except ValueError:
+            orm.delete()
+            return Response(
+                {"input_pic": ["이미지를 읽을 수 없습니다."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        data = dict(PictureSerializer(instance=orm).data)
+        data["preview"] = "data:image/jpeg;base64," + base64.b64encode(content).decode()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class PicgenJobView(APIView):
+    """PicgenJobView
+
+    비동기 picgen 작업의 진행 상태와 결과 Picture를 조회합니다.
+
+    Attributes:
+        permission (permissions): IsAuthenticated 로그인한 사용자만 접속을 허용합니다.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, picture_id):
+        """PicgenJobView.get
+
+        get요청 시 자신이 요청한 picture_id의 Picture를 status와 함께 반환합니다.
+
+        Args:
+            picture_id (int): POST picgen/ 에서 반환된 Picture의 id
+
+        정상 시 200 / Picture 반환 (status: PENDING, PROCESSING, DONE, FAILED)
+        오류 시 401 / 권한없음(비로그인)
+        오류 시 404 / 존재하지 않거나 다른 사용자의 작업
+        """
+        picture = get_object_or_404(Picture, id=picture_id, author=request.user)
+        serializer = PictureSerializer(instance=picture)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PicgenRerollView(APIView):
+    """PicgenRerollView
+
+    변환이 끝난 사진의 스티커를 다시 골라 변환사진을 새로 만듭니다.
+    저장해 둔 얼굴 박스를 쓰므로 사진을 다시 올리거나 얼굴을 다시 탐지하지 않습니다.
+
+    Attributes:
+        permission (permissions): IsAuthenticated 로그인한 사용자만 접속을 허용합니다.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, picture_id):
+        """PicgenRerollView.post
+
+        post요청 시 자신이 요청한 picture_id의 변환사진을 다른 얼굴이나 스티커로 다시 만들어 반환합니다.
+
+        Args:
+            picture_id (int): POST picgen/ 에서 반환된 Picture의 id
+
+        정상 시 200 / 새 변환사진의 Picture 반환
+        오류 시 400 / 변환할 수 없는 사진
+        오류 시 401 / 권한없음(비로그인)
+        오류 시 404 / 존재하지 않거나, 다른 사용자의 작업이거나, 변환이 끝나지 않은 작업
+        오류 시 503 / 렌더링 프로세스 풀의 응답 시간 초과
+        """
+        picture = get_object_or_404(
+            Picture, id=picture_id, author=request.user, status=Picture.DONE
+        )
+        try:
+            reroll(picture)
+        except TimeoutError:
+            return Response(
+                {"message": "이미지 생성 시간이 초과되었습니다."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        except ValueError:
+            return Response(
+                {"input_pic": ["이미지를 읽을 수 없습니다."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = PictureSerializer(instance=picture)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def media(request, path):
+    """media 미디어 파일 반환
+
+    media 파일을 반환합니다. (media.serve_file 참고)
+    내용 주소 파일은 강한 ETag와 Cache-Control: immutable로 브라우저와 프록시가 캐시하고, Range 요청을 지원합니다.
+    migrate_media 명령어로 옮긴 파일의 이전 경로이면 새 경로로 보냅니다.
+    drop_renders 명령어로 지운 변환사진이면 input_pic과 seed로 다시 만들어 반환합니다.
+
+    Args:
+        path (str): MEDIA_URL 뒤의 storage 경로
+
+    정상 시 200 / 파일 반환
+    정상 시 206 / Range 요청의 범위 반환
+    정상 시 301 / 옮긴 파일의 새 경로
+    정상 시 304 / If-None-Match의 ETag와 같은 파일
+    오류 시 404 / 존재하지 않는 파일
+    오류 시 416 / 파일 밖의 범위
+    """
+    try:
+        return serve_file(request, path)
+    except Http404:
+        alias = MediaAlias.objects.filter(old_name=path).first()
+        if alias is not None:
+            return redirect(settings.MEDIA_URL + alias.new_name, permanent=True)
+        picture = Picture.objects.filter(change_pic=path).first()
+        if picture is None or not materialize(picture):
+            raise
+        return serve_file(request, picture.change_pic.name)
@@ -151,6 +151,13 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# media 파일은 내용의 sha256으로 나눈 폴더(ab/cd/<sha256>.ext)에 저장하고 같은 내용은 한 번만 저장합니다.
+# 원격 객체 저장소를 쓰려면 OPTIONS에 "store"(클래스 경로)와 "store_options"를 지정합니다.
+STORAGES = {
+    "default": {"BACKEND": "ai_process.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -165,3 +172,67 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
 }
+
+# 이미지 처리(ai_process) 설정입니다.
+# 워커 기동 시 얼굴 탐지기를 미리 생성할지 여부 (이미지 처리 워커에서 AI_PROCESS_WARMUP=1)
+AI_PROCESS_WARMUP = os.environ.get("AI_PROCESS_WARMUP") == "1"
+# 업로드 사진의 최대 픽셀 수. 넘으면 디코딩하지 않고 413으로 거부합니다. 0이면 제한하지 않습니다.
+AI_PROCESS_MAX_PIXELS = 40 * 10**6
+# 변환사진의 최대 변 길이(px). 더 큰 사진은 JPEG DCT 축소 디코딩 후 이 크기로 줄입니다. 0이면 원본 크기로 만듭니다.
+AI_PROCESS_MAX_SIDE = 2048
+# 얼굴 탐지용 축소 사본의 최대 변 길이(px). 0이면 원본 해상도에서 탐지합니다.
+AI_PROCESS_DETECT_MAX_SIDE = 1024
+# 얼굴 탐지기: "dlib"(HOG) 또는 "haar"(OpenCV Haar cascade). bench_detectors 명령어로 비교할 수 있습니다.
+AI_PROCESS_DETECTOR = os.environ.get("AI_PROCESS_DETECTOR", "dlib")
+# True이면 picgen 요청은 202와 작업 id를 바로 반환하고, 변환은 작업 큐에서 처리합니다.
+AI_PROCESS_PICGEN_ASYNC = False
+# 웹 워커 프로세스 안에서 picgen 작업을 처리할 스레드 수. 0이면 picgen_worker 명령어로 별도 실행합니다.
+AI_PROCESS_WORKERS = 2
+# 처리중(PROCESSING)인 picgen 작업이 이 시간(초) 안에 끝나지 않으면 워커가 죽은 것으로 보고 다시 대기열에 넣습니다.
+# 웹 워커는 요청이 들어올 때 이 주기로 남은 작업을 다시 확인합니다.
+AI_PROCESS_JOB_TIMEOUT = 300
+# 스티커 렌더링 전용 프로세스 수. 0이면 요청을 처리하는 스레드에서 렌더링합니다.
+AI_PROCESS_POOL_SIZE = int(os.environ.get("AI_PROCESS_POOL_SIZE", "0"))
+# 렌더링 프로세스 하나가 새 프로세스로 교체되기 전까지 처리할 작업 수
+AI_PROCESS_POOL_MAX_JOBS = 100
+# 렌더링 프로세스 풀의 결과를 기다릴 최대 시간(초). 넘으면 그 작업을 처리하던 렌더링 프로세스를 종료하고 새로 띄웁니다.
+AI_PROCESS_POOL_TIMEOUT = 30
+# 스티커 원본 PNG 폴더. 파일 이름 앞부분(up/top, left, right, under)으로 스티커 방향을 정합니다.
+AI_PROCESS_STICKER_DIR = BASE_DIR / "static" / "imgs"
+# build_stickers 명령어로 만든 스티커 묶음(stickers.npy, stickers.json) 폴더
+AI_PROCESS_STICKER_PACK = BASE_DIR / "stickers"
+# resize한 스티커 캐시의 최대 크기(바이트)
+AI_PROCESS_STICKER_CACHE_BYTES = 64 * 2**20
+# 스티커 캐시 키로 쓸 크기 올림 단위(px). 0이면 정확한 크기별로 캐시합니다.
+AI_PROCESS_STICKER_BUCKET = 8
+# 변환사진 인코딩 형식: "webp", "jpeg"(progressive), "png". 비워 두면 입력사진과 같은 형식으로 저장합니다.
+AI_PROCESS_OUTPUT_FORMAT = "webp"
+# 변환사진 JPEG/WebP 품질(1~100)
+AI_PROCESS_OUTPUT_QUALITY = 85
+# 게시글 목록용으로 함께 만들 변환사진 너비(px)들. 변환사진보다 작은 너비만 만듭니다.
+AI_PROCESS_DERIVATIVE_WIDTHS = (320, 640, 1280)
+# 미리보기를 렌더링할 최대 변 길이(px). 작을수록 빠르지만 작은 얼굴을 찾지 못합니다.
+AI_PROCESS_PREVIEW_SIDE = 640
+# 미리보기 JPEG 품질(1~100)
+AI_PROCESS_PREVIEW_QUALITY = 70
+# picgen 단계별 최대 메모리 측정 여부 (Server-Timing desc). tracemalloc을 켜므로 프로파일링할 때만 사용합니다.
+AI_PROCESS_TIMING_MEMORY = False
+# 게시글에 붙지 않은 Picture를 sweep_pictures 명령어가 지우기까지의 시간
+AI_PROCESS_ORPHAN_TTL_HOURS = 24
+# sweep_pictures가 한 번에 지울 Picture 수
+AI_PROCESS_SWEEP_BATCH = 500
+# sweep_pictures의 파일 삭제 스레드 수
+AI_PROCESS_SWEEP_WORKERS = 8
+# media 파일을 프런트 웹 서버가 보내게 할 헤더: "x-accel-redirect"(nginx), "x-sendfile"(Apache, lighttpd).
+# 비워 두면 Django가 파일을 읽어 보냅니다.
+AI_PROCESS_MEDIA_ACCEL = os.environ.get("AI_PROCESS_MEDIA_ACCEL", "")
+# X-Accel-Redirect 경로 앞부분. nginx에서 MEDIA_ROOT를 가리키는 internal location으로 설정합니다.
+AI_PROCESS_MEDIA_ACCEL_PREFIX = "/protected-media/"
+# 내용 주소가 아닌 이전 경로 media 파일의 캐시 기간(초)
+AI_PROCESS_MEDIA_MAX_AGE = 3600
+# 프로세스 안에 두는 고양이 멘트 캐시의 최대 개수. 0이면 MentCache 테이블만 씁니다.
+AI_PROCESS_MENT_CACHE_SIZE = 1024
+# 고양이 멘트 캐시의 유효 기간(시간). 지나면 chat gpt로 다시 만듭니다.
+AI_PROCESS_MENT_CACHE_TTL_HOURS = 24 * 7
+# 같은 사진의 변환 결과를 재사용하는 렌더 캐시의 최대 용량(바이트). 0이면 렌더 캐시를 쓰지 않습니다.
+AI_PROCESS_RENDER_CACHE_BYTES = 512 * 2**20
@@ -14,11 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.urls import include
 from django.conf import settings
 from django.conf.urls.static import static
+from ai_process.views import media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -26,4 +28,6 @@ urlpatterns = [
     path("article/", include("article.urls")),
 ]
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# 지워진 변환사진을 다시 만들 수 있도록 media는 ai_process의 뷰가 반환합니다.
+# 운영 환경에서는 AI_PROCESS_MEDIA_ACCEL로 파일 전송을 프런트 웹 서버에 맡깁니다.
+urlpatterns += [re_path(r"^%s(?P<path>.*)$" % settings.MEDIA_URL.lstrip("/"), media)]
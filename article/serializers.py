@@ -154,8 +154,32 @@ class ArticleListSerializer(ArticleSerializer):
     """ArticleListSerializer: Article의 개략적인 정보
 
     Article의 일부 정보만 조회하여 목록을 형성할 때 사용합니다.
+
+    Attributes:
+        change_pic_srcset (dict): 너비별로 줄인 변환사진의 경로 ({"320w": 경로, ...})
     """
 
+    change_pic_srcset = serializers.SerializerMethodField()
+
+    def get_change_pic_srcset(self, obj):
+        """get_change_pic_srcset 너비별 변환사진 경로 가져오기
+
+        목록에서 화면 크기에 맞는 변환사진을 고를 수 있도록 너비별 변환사진의 경로를 가져옵니다.
+        변환사진보다 작은 너비만 있으므로 원본 크기는 change_pic을 사용합니다.
+
+        Args:
+            obj (Article): ORM객체
+        Return:
+            (dict): "너비w"를 키로 /media부터의 경로를 반환합니다.
+        Raises:
+            없음
+        """
+        derivatives = obj.pictures.derivatives or {}
+        return {
+            f"{width}w": "/media/" + derivatives[width]
+            for width in sorted(derivatives, key=int)
+        }
+
     class Meta:
         """
         id는 aticle_id 입니다.
@@ -171,6 +195,7 @@ class ArticleListSerializer(ArticleSerializer):
             "comment_count",
             "created_at",
             "change_pic",
+            "change_pic_srcset",
         )
 
 
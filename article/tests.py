@@ -1,9 +1,29 @@
 from django.urls import reverse
+import base64
+import io
+import json
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import quote, unquote
+import openai
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from user.models import User
 from article.models import Article, Comment
-from ai_process.models import Picture
+from ai_process import ment
+from ai_process.models import MentCache, Picture, RenderCache
+from ai_process.jobs import run_pending
+from ai_process.storage import is_content_name
 
 
 """article 테스트 요약
@@ -28,15 +48,79 @@ from ai_process.models import Picture
 
 15. 멘트생성
 16. 이미지생성
+17. 비동기 이미지생성
+18. 비동기 이미지생성 상태조회
+19. 이미지생성 결과 저장
+20. 변환할 수 없는 이미지
+21. 같은 사진 재업로드 시 렌더 캐시 사용
+22. 렌더 캐시 용량 초과
+23. 지운 변환사진을 요청 시 다시 생성
+24. 얼굴 탐지 없이 스티커 다시 고르기
+25. 모든 얼굴 모드 이미지생성
+26. 픽셀 수 제한을 넘는 이미지
+27. 이미지생성 출력 형식
+28. 게시글 목록의 너비별 변환사진
+29. 미리보기 후 게시글 작성 시 변환사진 생성
+30. 이미지생성 단계별 처리 시간
+31. 게시글에 붙지 않은 오래된 Picture 정리
+32. 이전 경로의 media 파일을 내용 주소 경로로 옮기기
+33. media 파일의 캐시 검증, 범위 요청, 웹 서버 전송
+34. 멘트 캐시 적중과 새로 만들기
+35. 멘트 토큰 스트리밍
+36. 렌더링 시간 초과 시 Picture 삭제
+37. 멈춘 작업 다시 처리
+38. 처리되지 않은 오래된 작업 정리
+39. ASCII가 아닌 이전 경로의 웹 서버 전송
+40. 지운 변환사진과 너비별 변환사진을 요청 시 다시 생성
 """
 
 
+class FakeChatHandler(BaseHTTPRequestHandler):
+    # chat completion API처럼 stream=True 요청에 토큰마다 chunk 하나로 SSE를 보냅니다.
+    # 첫 토큰을 보낸 뒤 테스트가 그 토큰을 받았다고 알릴 때까지 기다립니다.
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(self.server.tokens):
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            if i == 0:
+                self.server.resumed = self.server.resume.wait(5)
+        self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
 class ArticleBaseTestCase(APITestCase):
     """게시글기능 테스트 준비
 
     게시글기능 테스트를 위한 부모 클래스입니다.
     """
 
+    @classmethod
+    def setUpClass(cls):
+        # 테스트가 저장, 이동, 삭제하는 media 파일은 클래스마다 임시 폴더에 둡니다.
+        # 내용 주소 저장소는 같은 내용을 한 파일로 함께 쓰므로 실제 MEDIA_ROOT의 파일을 지울 수 있습니다.
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=cls.media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        super().setUpClass()
+
     @classmethod
     def setUpTestData(cls) -> None:
         cls.user = User.objects.create_user(
@@ -77,6 +161,13 @@ class ArticleBaseTestCase(APITestCase):
         cls.pic_gen_setup_data = {"input_pic": image_file2}
 
     def setUp(self) -> None:
+        # 테스트마다 setUpTestData가 만든 파일을 복사한 media 폴더를 써서, 한 테스트가 지운 파일이 다른 테스트에 영향을 주지 않게 합니다.
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        shutil.copytree(self.media_root, media_root, dirs_exist_ok=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
         login_user = self.client.post(reverse("token"), self.user_login_data).data
         self.access = login_user["access"]
         self.refresh = login_user["refresh"]
@@ -328,6 +419,146 @@ class AiProcessTestCase(ArticleBaseTestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    @mock.patch("openai.ChatCompletion.create")
+    def test_mentgen_cache(self, create):
+        """멘트 캐시 적중과 새로 만들기
+
+        공백, 대소문자만 다른 설명은 chat gpt를 다시 호출하지 않고,
+        프로세스 캐시가 비어도 MentCache 테이블에서 찾으며, fresh면 새로 만드는지 테스트합니다.
+        """
+        ment.clear()
+        self.addCleanup(ment.clear)
+        create.return_value.choices[0].message.content = "냥!"
+        url = reverse("ment_gen")
+        responses = [
+            self.client.post(
+                path=url,
+                HTTP_AUTHORIZATION=f"Bearer {self.access}",
+                data={"description": description},
+            )
+            for description in ("Cat  sleeps", " cat sleeps ")
+        ]
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual([r.data["message"] for r in responses], ["냥!", "냥!"])
+        self.assertEqual([r.data["cached"] for r in responses], [False, True])
+        self.assertEqual(ment.stats()["memory_hits"], 1)
+
+        ment.clear()
+        response = self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"description": "cat sleeps"},
+        )
+        self.assertTrue(response.data["cached"])
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(ment.stats()["db_hits"], 1)
+        self.assertEqual(MentCache.objects.get().hits, 1)
+
+        create.return_value.choices[0].message.content = "하악!"
+        response = self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"description": "cat sleeps", "fresh": "true"},
+        )
+        self.assertEqual(response.data, {"message": "하악!", "cached": False})
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(MentCache.objects.get().message, "하악!")
+        self.assertEqual(ment.stats()["hit_rate"], 0.5)
+
+        MentCache.objects.update(created_at=timezone.now() - timedelta(days=30))
+        ment.clear()
+        self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"description": "cat sleeps"},
+        )
+        self.assertEqual(create.call_count, 3)
+
+    def test_mentgen_stream(self):
+        """멘트 토큰 스트리밍
+
+        로컬의 가짜 chat completion 서버로, 전체 멘트가 만들어지기 전에 첫 토큰이 "token" 이벤트로 오고
+        마지막 "done" 이벤트에 전체 멘트가 오는지, 그 멘트가 캐시되는지 테스트합니다.
+        """
+        ment.clear()
+        self.addCleanup(ment.clear)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatHandler)
+        server.tokens = ["식빵", " 굽는데", " 방해하지마라냥!"]
+        server.requests = []
+        server.resume = threading.Event()
+        server.resumed = None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        patches = [
+            mock.patch.object(openai, "api_key", "test"),
+            mock.patch.object(
+                openai, "api_base", f"http://127.0.0.1:{server.server_port}/v1"
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        def events(response):
+            for part in b"".join(response.streaming_content).decode().split("\n\n"):
+                if part:
+                    event, data = part.split("\n")
+                    yield event.removeprefix("event: "), json.loads(
+                        data.removeprefix("data: ")
+                    )
+
+        url = reverse("ment_gen_stream")
+        response = self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"description": "고양이가 식빵을 굽는다"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/event-stream"))
+        received = []
+        for part in response.streaming_content:
+            received.append(part)
+            # 첫 토큰을 받아야 가짜 서버가 나머지 토큰을 보냅니다.
+            server.resume.set()
+        self.assertTrue(server.resumed)
+        self.assertTrue(server.requests[0]["stream"])
+        response.streaming_content = received
+        self.assertEqual(
+            list(events(response)),
+            [
+                ("token", {"text": "식빵"}),
+                ("token", {"text": " 굽는데"}),
+                ("token", {"text": " 방해하지마라냥!"}),
+                ("done", {"message": "식빵 굽는데 방해하지마라냥!", "cached": False}),
+            ],
+        )
+        self.assertEqual(MentCache.objects.get().message, "식빵 굽는데 방해하지마라냥!")
+
+        response = self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"description": "고양이가  식빵을 굽는다"},
+        )
+        self.assertEqual(
+            list(events(response)),
+            [
+                ("token", {"text": "식빵 굽는데 방해하지마라냥!"}),
+                ("done", {"message": "식빵 굽는데 방해하지마라냥!", "cached": True}),
+            ],
+        )
+        self.assertEqual(len(server.requests), 1)
+
+        with mock.patch.object(openai, "api_key", None), self.assertLogs(
+            "ai_process.views", "ERROR"
+        ):
+            response = self.client.post(
+                path=url,
+                HTTP_AUTHORIZATION=f"Bearer {self.access}",
+                data={"description": "고양이가 식빵을 굽는다", "fresh": "1"},
+            )
+            self.assertEqual([e for e, _ in events(response)], ["error"])
+
     def test_picgen(self):
         """이미지 생성
 
@@ -341,3 +572,523 @@ class AiProcessTestCase(ArticleBaseTestCase):
             data=data,
         )
         self.assertEqual(response.status_code, 201)
+
+    def test_picgen_server_timing(self):
+        """이미지생성 단계별 처리 시간
+
+        변환한 요청의 Server-Timing 헤더에 단계별 처리 시간이 담기는지 테스트합니다.
+        """
+        RenderCache.objects.all().delete()
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.status_code, 201)
+        stages = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        for name in ("storage", "decode", "detect", "encode", "derive", "total"):
+            self.assertIn(name, stages)
+
+    @override_settings(AI_PROCESS_OUTPUT_FORMAT="")
+    def test_picgen_saved(self):
+        """이미지생성 결과 저장
+
+        출력 형식을 정하지 않으면 변환사진이 storage의 내용 주소 경로에 입력사진과 같은 형식으로 저장되는지 테스트합니다.
+        """
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        picture = Picture.objects.get(id=response.data["id"])
+        self.assertTrue(is_content_name(picture.change_pic.name))
+        self.assertTrue(picture.change_pic.name.endswith(".jpg"))
+        self.assertEqual(picture.change_format, Picture.JPEG)
+        with picture.change_pic.open("rb") as f:
+            self.assertEqual(Image.open(f).format, "JPEG")
+
+    def test_picgen_output_format(self):
+        """이미지생성 출력 형식
+
+        변환사진이 설정한 형식(WebP, progressive JPEG)으로 인코딩되고 그 형식이 기록되는지 테스트합니다.
+        """
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.data["change_format"], Picture.WEBP)
+        picture = Picture.objects.get(id=response.data["id"])
+        self.assertTrue(picture.change_pic.name.endswith(".webp"))
+        with picture.change_pic.open("rb") as f:
+            self.assertEqual(Image.open(f).format, "WEBP")
+        with override_settings(AI_PROCESS_OUTPUT_FORMAT="jpeg"):
+            response = self.client.post(
+                path=reverse("pic_gen_reroll", args=[picture.id]),
+                HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            )
+        self.assertEqual(response.data["change_format"], Picture.JPEG)
+        picture.refresh_from_db()
+        with picture.change_pic.open("rb") as f:
+            image = Image.open(f)
+            self.assertEqual(image.format, "JPEG")
+            self.assertTrue(image.info.get("progressive"))
+            self.assertNotIn("exif", image.info)
+
+    def test_picgen_undecodable(self):
+        """변환할 수 없는 이미지
+
+        Pillow는 읽지만 OpenCV가 읽을 수 없는 이미지(GIF)는 400을 반환하는지 테스트합니다.
+        """
+        buf = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buf, format="GIF")
+        gif = SimpleUploadedFile("test.gif", buf.getvalue(), content_type="image/gif")
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={"input_pic": gif},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_picgen_render_cache(self):
+        """같은 사진 재업로드 시 렌더 캐시 사용
+
+        같은 사진을 다시 올리면 이전 변환사진 파일을 함께 쓰고, 이전 Picture가 지워져도 파일이 남는지 테스트합니다.
+        """
+        setup_picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.status_code, 201)
+        picture = Picture.objects.get(id=response.data["id"])
+        self.assertEqual(picture.change_pic.name, setup_picture.change_pic.name)
+        self.assertEqual(RenderCache.objects.get().hits, 1)
+        setup_picture.delete()
+        self.assertTrue(picture.change_pic.storage.exists(picture.change_pic.name))
+
+    @override_settings(AI_PROCESS_RENDER_CACHE_BYTES=1)
+    def test_picgen_render_cache_evict(self):
+        """렌더 캐시 용량 초과
+
+        캐시 용량을 넘는 변환사진은 캐시에서 지워지지만, Picture가 쓰는 파일은 남는지 테스트합니다.
+        """
+        RenderCache.objects.all().delete()
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        picture = Picture.objects.get(id=response.data["id"])
+        self.assertFalse(RenderCache.objects.exists())
+        self.assertTrue(picture.change_pic.storage.exists(picture.change_pic.name))
+
+    def test_picgen_materialize(self):
+        """지운 변환사진을 요청 시 다시 생성
+
+        drop_renders로 지운 변환사진을 요청하면 input_pic과 seed로 같은 사진이 다시 만들어지는지 테스트합니다.
+        """
+        picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        Article.objects.create(
+            author=self.user, title="title", pictures=picture, description="desc"
+        )
+        RenderCache.objects.all().delete()
+        with picture.change_pic.open("rb") as f:
+            expected = f.read()
+        call_command("drop_renders", days=0, stdout=io.StringIO())
+        self.assertFalse(picture.change_pic.storage.exists(picture.change_pic.name))
+        response = self.client.get("/media/" + picture.change_pic.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), expected)
+
+    def test_picgen_materialize_derivatives(self):
+        """지운 변환사진과 너비별 변환사진을 요청 시 다시 생성
+
+        drop_renders가 너비별 변환사진도 지우고 게시글 목록의 srcset을 비우며,
+        변환사진을 요청하면 change_pic과 너비별 변환사진이 함께 다시 만들어지는지 테스트합니다.
+        """
+        picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        article = Article.objects.create(
+            author=self.user, title="title", pictures=picture, description="desc"
+        )
+        RenderCache.objects.all().delete()
+        storage = picture.change_pic.storage
+        with storage.open(picture.derivatives["320"], "rb") as f:
+            expected = f.read()
+
+        def srcset():
+            response = self.client.get(reverse("article") + "?page=1")
+            listed = [a for a in response.data["results"] if a["id"] == article.id]
+            return listed[0]["change_pic_srcset"]
+
+        call_command("drop_renders", days=0, stdout=io.StringIO())
+        self.assertFalse(storage.exists(picture.change_pic.name))
+        self.assertFalse(storage.exists(picture.derivatives["320"]))
+        self.assertEqual(Picture.objects.get(id=picture.id).derivatives, {})
+        self.assertEqual(srcset(), {})
+        response = self.client.get("/media/" + picture.change_pic.name)
+        self.assertEqual(response.status_code, 200)
+        rebuilt = Picture.objects.get(id=picture.id)
+        self.assertTrue(storage.exists(rebuilt.change_pic.name))
+        self.assertEqual(list(rebuilt.derivatives), ["320"])
+        with storage.open(rebuilt.derivatives["320"], "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(srcset(), {"320w": "/media/" + rebuilt.derivatives["320"]})
+
+    def test_picgen_reroll(self):
+        """얼굴 탐지 없이 스티커 다시 고르기
+
+        저장된 얼굴 박스로 다른 얼굴이나 스티커의 변환사진을 새로 만들고, 얼굴 탐지는 실행하지 않는지 테스트합니다.
+        """
+        picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        self.assertTrue(picture.faces)
+        with mock.patch("ai_process.cat.detect_faces") as detect_faces:
+            response = self.client.post(
+                path=reverse("pic_gen_reroll", args=[picture.id]),
+                HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            )
+        self.assertEqual(response.status_code, 200)
+        detect_faces.assert_not_called()
+        rerolled = Picture.objects.get(id=picture.id)
+        self.assertEqual(rerolled.faces, picture.faces)
+        self.assertNotEqual(rerolled.change_pic.name, picture.change_pic.name)
+        self.assertNotEqual(
+            (rerolled.face, rerolled.sticker), (picture.face, picture.sticker)
+        )
+        # 이전 변환사진은 렌더 캐시가 계속 씁니다.
+        self.assertTrue(picture.change_pic.storage.exists(picture.change_pic.name))
+
+    def test_picgen_all_faces(self):
+        """모든 얼굴 모드 이미지생성
+
+        mode가 ALL이면 모든 얼굴에 스티커를 붙이고, 얼굴 하나 모드의 렌더 캐시를 쓰지 않는지 테스트합니다.
+        """
+        setup_picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={**self.pic_gen_test_data, "mode": Picture.ALL_FACES},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["mode"], Picture.ALL_FACES)
+        self.assertIsNone(response.data["face"])
+        self.assertEqual(
+            len(response.data["sticker"].split(",")), len(response.data["faces"])
+        )
+        picture = Picture.objects.get(id=response.data["id"])
+        self.assertNotEqual(picture.change_pic.name, setup_picture.change_pic.name)
+
+    def test_picgen_derivatives(self):
+        """게시글 목록의 너비별 변환사진
+
+        변환사진보다 작은 너비의 변환사진이 함께 저장되고, 게시글 목록에만 그 경로가 포함되는지 테스트합니다.
+        """
+        picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        # 테스트 사진의 너비가 640px이므로 320px만 만들어집니다.
+        self.assertEqual(list(picture.derivatives), ["320"])
+        with picture.change_pic.storage.open(picture.derivatives["320"], "rb") as f:
+            self.assertEqual(Image.open(f).width, 320)
+        article = Article.objects.create(
+            author=self.user, title="title", pictures=picture, description="desc"
+        )
+        response = self.client.get(reverse("article") + "?page=1")
+        listed = [a for a in response.data["results"] if a["id"] == article.id][0]
+        self.assertEqual(
+            listed["change_pic_srcset"],
+            {"320w": "/media/" + picture.derivatives["320"]},
+        )
+        response = self.client.get(
+            reverse("article_detail", kwargs={"article_id": article.id})
+        )
+        self.assertNotIn("change_pic_srcset", response.data)
+
+    @override_settings(AI_PROCESS_PREVIEW_SIDE=640)
+    def test_picgen_preview(self):
+        """미리보기 후 게시글 작성 시 변환사진 생성
+
+        미리보기는 작은 JPEG만 반환하고, 게시글을 작성할 때 미리보기에서 고른 얼굴과 스티커로 변환사진이 만들어지는지 테스트합니다.
+        """
+        # 미리보기에서도 얼굴이 탐지되도록 두 배 크기 사진을 올립니다.
+        image = Image.open("static/test_image.jpg")
+        buffer = io.BytesIO()
+        image.resize((image.width * 2, image.height * 2)).save(buffer, "JPEG")
+        response = self.client.post(
+            path=reverse("pic_gen_preview"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={
+                "input_pic": SimpleUploadedFile(
+                    "test_image.jpg", buffer.getvalue(), content_type="image/jpeg"
+                )
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["status"], Picture.PREVIEW)
+        self.assertIsNone(response.data["change_pic"])
+        header, content = response.data["preview"].split(",", 1)
+        self.assertEqual(header, "data:image/jpeg;base64")
+        image = Image.open(io.BytesIO(base64.b64decode(content)))
+        self.assertEqual((image.format, image.width), ("JPEG", 640))
+        # 미리보기는 작업 큐에 들어가지 않습니다.
+        self.assertEqual(run_pending(), 0)
+        picture_id = response.data["id"]
+        chosen = [response.data[key] for key in ("face", "sticker", "placements")]
+        self.assertTrue(response.data["placements"])
+        response = self.client.post(
+            path=reverse("article"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={**self.article_create_data, "pictures": picture_id},
+        )
+        self.assertEqual(response.status_code, 201)
+        picture = Picture.objects.get(id=picture_id)
+        self.assertEqual(picture.status, Picture.DONE)
+        self.assertEqual(picture.width, 1280)
+        self.assertEqual([picture.face, picture.sticker, picture.placements], chosen)
+        with picture.change_pic.open("rb") as f:
+            self.assertEqual(Image.open(f).width, 1280)
+
+    def test_picgen_sweep(self):
+        """게시글에 붙지 않은 오래된 Picture 정리
+
+        TTL이 지난 Picture 행과 파일만 지우고, 게시글의 Picture와 렌더 캐시가 쓰는 변환사진은 남기는지 테스트합니다.
+        """
+        setup_picture = Picture.objects.get(id=self.pic_gen_setup_id)
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data={**self.pic_gen_test_data, "mode": Picture.ALL_FACES},
+        )
+        orphan = Picture.objects.get(id=response.data["id"])
+        Article.objects.create(
+            author=self.user, title="title", pictures=setup_picture, description="desc"
+        )
+        Picture.objects.update(created_at=timezone.now() - timedelta(days=2))
+        # 요청 경로에서는 이전 Picture를 지우지 않습니다.
+        self.assertTrue(Picture.objects.filter(id=orphan.id).exists())
+        RenderCache.objects.filter(change_pic=orphan.change_pic.name).delete()
+        out = io.StringIO()
+        call_command("sweep_pictures", hours=24, batch_size=1, stdout=out)
+        self.assertFalse(Picture.objects.filter(id=orphan.id).exists())
+        self.assertTrue(Picture.objects.filter(id=setup_picture.id).exists())
+        storage = orphan.change_pic.storage
+        self.assertFalse(storage.exists(orphan.change_pic.name))
+        for name in orphan.derivatives.values():
+            self.assertFalse(storage.exists(name))
+        # 같은 사진을 올렸으므로 입력사진 파일은 게시글의 Picture와 함께 쓰고 있어 남습니다.
+        self.assertEqual(orphan.input_pic.name, setup_picture.input_pic.name)
+        self.assertTrue(storage.exists(setup_picture.input_pic.name))
+        self.assertTrue(storage.exists(setup_picture.change_pic.name))
+
+    @override_settings(AI_PROCESS_PICGEN_ASYNC=True, AI_PROCESS_WORKERS=0)
+    def test_picgen_sweep_jobs(self):
+        """처리되지 않은 오래된 작업 정리
+
+        TTL이 지나도록 대기중인 작업과 멈춘 처리중 작업은 지우고, 처리중인 작업은 남기는지 테스트합니다.
+        """
+        ids = [self.post_picgen_job() for _ in range(3)]
+        pending, stale, running = ids
+        Picture.objects.update(created_at=timezone.now() - timedelta(days=2))
+        Picture.objects.filter(id=stale).update(
+            status=Picture.PROCESSING, claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        Picture.objects.filter(id=running).update(
+            status=Picture.PROCESSING, claimed_at=timezone.now()
+        )
+        call_command("sweep_pictures", hours=24, stdout=io.StringIO())
+        self.assertFalse(Picture.objects.filter(id__in=(pending, stale)).exists())
+        self.assertTrue(Picture.objects.filter(id=running).exists())
+
+    def test_migrate_media(self):
+        """이전 경로의 media 파일을 내용 주소 경로로 옮기기
+
+        migrate_media가 이전 경로의 파일을 옮겨 Picture 경로를 바꾸고, 이전 URL은 새 경로로 보내는지 테스트합니다.
+        """
+        store = default_storage.store
+        content = open("static/test_image.jpg", "rb").read()
+        store.put("2023/06/input/legacy.jpg", ContentFile(content))
+        store.put("2023/06/change/legacy.jpg", ContentFile(content[:-1]))
+        picture = Picture.objects.create(
+            author=self.user,
+            input_pic="2023/06/input/legacy.jpg",
+            change_pic="2023/06/change/legacy.jpg",
+        )
+        call_command("migrate_media", batch_size=1, stdout=io.StringIO())
+        picture.refresh_from_db()
+        self.assertTrue(is_content_name(picture.input_pic.name))
+        self.assertTrue(is_content_name(picture.change_pic.name))
+        self.assertFalse(store.exists("2023/06/input/legacy.jpg"))
+        with picture.input_pic.open("rb") as f:
+            self.assertEqual(f.read(), content)
+        response = self.client.get("/media/2023/06/change/legacy.jpg")
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response["Location"], "/media/" + picture.change_pic.name)
+
+    def test_media(self):
+        """media 파일의 캐시 검증, 범위 요청, 웹 서버 전송
+
+        내용 주소 파일에 강한 ETag와 immutable이 붙고, If-None-Match, Range, X-Accel-Redirect가 동작하는지 테스트합니다.
+        """
+        name = Picture.objects.get(id=self.pic_gen_setup_id).change_pic.name
+        url = "/media/" + name
+        with default_storage.open(name) as f:
+            content = f.read()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), content)
+        tag = response["ETag"]
+        self.assertRegex(tag, r'^"[0-9a-f]{64}"$')
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Type"], "image/webp")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(content)}")
+        self.assertEqual(b"".join(response.streaming_content), content[10:20])
+        response = self.client.get(url, HTTP_RANGE="bytes=-5", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_RANGE=f"bytes={len(content)}-")
+        self.assertEqual(response.status_code, 416)
+        with override_settings(AI_PROCESS_MEDIA_ACCEL="x-accel-redirect"):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + name)
+        self.assertEqual(response.content, b"")
+
+    def test_media_accel_legacy_name(self):
+        """ASCII가 아닌 이전 경로의 웹 서버 전송
+
+        한글 이름의 이전 경로 파일은 X-Accel-Redirect, X-Sendfile 값이 URL 인코딩되는지 테스트합니다.
+        """
+        name = "2023/06/input/고양이 사진.jpg"
+        store = default_storage.store
+        store.put(name, ContentFile(b"legacy"))
+        self.addCleanup(store.delete, name)
+        url = "/media/" + quote(name)
+        with override_settings(AI_PROCESS_MEDIA_ACCEL="x-accel-redirect"):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/" + quote(name)
+        )
+        with override_settings(AI_PROCESS_MEDIA_ACCEL="x-sendfile"):
+            response = self.client.get(url)
+        self.assertTrue(response["X-Sendfile"].isascii())
+        self.assertEqual(unquote(response["X-Sendfile"]), store.path(name))
+
+    @override_settings(AI_PROCESS_MAX_PIXELS=1000)
+    def test_picgen_too_large(self):
+        """픽셀 수 제한을 넘는 이미지
+
+        픽셀 수 제한을 넘는 사진은 저장하지 않고 413을 반환하는지 테스트합니다.
+        """
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Picture.objects.filter(id__gt=self.pic_gen_setup_id).exists())
+
+    @mock.patch("ai_process.views.render_picture", side_effect=TimeoutError)
+    def test_picgen_timeout(self, render_picture):
+        """렌더링 시간 초과
+
+        렌더링 프로세스 풀의 시간이 초과되면 503을 반환하고, 변환사진이 없는 Picture를 남기지 않는지 테스트합니다.
+        """
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(render_picture.call_count, 1)
+        self.assertFalse(Picture.objects.filter(id__gt=self.pic_gen_setup_id).exists())
+
+    @override_settings(AI_PROCESS_PICGEN_ASYNC=True, AI_PROCESS_WORKERS=0)
+    def test_picgen_async(self):
+        """비동기 이미지생성
+
+        비동기 모드에서 202와 대기 상태의 작업이 반환되고, 작업 선점 시각은 입력받거나 반환하지 않는지 테스트합니다.
+        """
+        url = reverse("pic_gen")
+        data = {**self.pic_gen_test_data, "claimed_at": "2000-01-01T00:00:00Z"}
+        response = self.client.post(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=data,
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], Picture.PENDING)
+        self.assertIsNone(response.data["change_pic"])
+        self.assertNotIn("claimed_at", response.data)
+        self.assertIsNone(Picture.objects.get(id=response.data["id"]).claimed_at)
+
+    @override_settings(AI_PROCESS_PICGEN_ASYNC=True, AI_PROCESS_WORKERS=0)
+    def test_picgen_job(self):
+        """비동기 이미지생성 상태조회
+
+        작업 워커가 처리한 뒤 상태조회에서 완료된 결과가 반환되는지 테스트합니다.
+        """
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        url = reverse("pic_gen_job", kwargs={"picture_id": response.data["id"]})
+        self.assertEqual(run_pending(), 1)
+        response = self.client.get(
+            path=url,
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], Picture.DONE)
+        self.assertIsNotNone(response.data["change_pic"])
+
+    def post_picgen_job(self):
+        # 같은 업로드 파일로 비동기 이미지생성을 여러 번 요청하고 작업 id를 반환합니다.
+        self.pic_gen_test_data["input_pic"].seek(0)
+        response = self.client.post(
+            path=reverse("pic_gen"),
+            HTTP_AUTHORIZATION=f"Bearer {self.access}",
+            data=self.pic_gen_test_data,
+        )
+        self.assertEqual(response.status_code, 202)
+        return response.data["id"]
+
+    @override_settings(AI_PROCESS_PICGEN_ASYNC=True, AI_PROCESS_WORKERS=0)
+    def test_picgen_job_recover(self):
+        """멈춘 작업 다시 처리
+
+        선점한 지 오래된 처리중 작업은 다시 대기시켜 처리하고, 웹 워커의 첫 요청에서 남은 작업을 스레드 풀에 넘기는지 테스트합니다.
+        """
+        ids = [self.post_picgen_job() for _ in range(3)]
+        stale, running, pending = ids
+        Picture.objects.filter(id=stale).update(
+            status=Picture.PROCESSING, claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        Picture.objects.filter(id=running).update(
+            status=Picture.PROCESSING, claimed_at=timezone.now()
+        )
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(Picture.objects.get(id=stale).status, Picture.DONE)
+        self.assertEqual(Picture.objects.get(id=pending).status, Picture.DONE)
+        self.assertEqual(Picture.objects.get(id=running).status, Picture.PROCESSING)
+
+        Picture.objects.filter(id=running).update(
+            claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        executor = mock.Mock()
+        executor.submit.side_effect = lambda fn, *args: fn(*args)
+        url = reverse("pic_gen_job", kwargs={"picture_id": running})
+        with mock.patch(
+            "ai_process.jobs.get_executor", return_value=executor
+        ), mock.patch("ai_process.jobs.close_old_connections"), mock.patch(
+            "ai_process.jobs._recovered_at", None
+        ):
+            response = self.client.get(
+                path=url, HTTP_AUTHORIZATION=f"Bearer {self.access}"
+            )
+            self.assertEqual(response.data["status"], Picture.DONE)
+            calls = executor.submit.call_count
+            self.client.get(path=url, HTTP_AUTHORIZATION=f"Bearer {self.access}")
+            self.assertEqual(executor.submit.call_count, calls)
@@ -1,6 +1,13 @@
 from django.urls import path
 from article import views
-from ai_process.views import MentgenView, PicgenView
+from ai_process.views import (
+    MentgenView,
+    MentgenStreamView,
+    PicgenView,
+    PicgenJobView,
+    PicgenPreviewView,
+    PicgenRerollView,
+)
 
 
 urlpatterns = [
@@ -15,5 +22,13 @@ urlpatterns = [
         name="article_comment_detail_view",
     ),
     path("mentgen/", MentgenView.as_view(), name="ment_gen"),
+    path("mentgen/stream/", MentgenStreamView.as_view(), name="ment_gen_stream"),
     path("picgen/", PicgenView.as_view(), name="pic_gen"),
+    path("picgen/preview/", PicgenPreviewView.as_view(), name="pic_gen_preview"),
+    path("picgen/<int:picture_id>/", PicgenJobView.as_view(), name="pic_gen_job"),
+    path(
+        "picgen/<int:picture_id>/reroll/",
+        PicgenRerollView.as_view(),
+        name="pic_gen_reroll",
+    ),
 ]
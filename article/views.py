@@ -21,6 +21,7 @@ from datetime import timedelta
 from user.models import User
 from rest_framework.generics import get_object_or_404
 from django.utils import timezone
+from ai_process.jobs import commit
 
 
 # Create your views here.
@@ -116,13 +117,16 @@ class ArticleView(generics.ListCreateAPIView):
 
         request body로 title,description,pictures(Picture모델 객체의 id),cat_says를 받습니다.
         serializer를 통해 검증된 정보를 만들어 Article을 저장합니다.
+        pictures가 미리보기 상태이면 변환사진을 만듭니다. (비동기 모드에서는 작업 큐에 넘깁니다.)
 
         정상 시 201 / "작성완료" 메세지를 반환합니다.
         비정상 시 400 / error내용을 반환합니다.
         """
         serializer = ArticleCreateSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            article = serializer.save(author=request.user)
+            # picgen/preview/ 로 미리보기만 만든 사진은 이때 전체 해상도로 변환합니다.
+            commit(article.pictures)
 
             return Response(
                 {"message": "작성완료"},